@@ -0,0 +1,105 @@
+import os
+import zlib
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+from loguru import logger
+
+
+class AudioCache:
+    """磁盘上的 TTS 音频缓存，按 文本/引擎/说话人/语速/采样率 作键。
+
+    每条音频一个文件：WAV 用 zlib 压缩后存为 ``<key>.wav.z``，MP3 本身已压缩，原样存为
+    ``<key>.mp3``。总大小超过 ``max_bytes`` 时按最近使用顺序淘汰（用文件修改时间记录使用时间，
+    重启后仍然有效）。读取时整个文件一次读入再解压：播放需要一份独立的字节串，mmap 省不掉这次拷贝。
+    """
+
+    def __init__(self, cache_dir="data/tts_cache", max_bytes=256 * 1024 * 1024, level=6):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # key -> (文件名, 字节数)
+        self._bytes = 0
+        entries = []
+        for entry in os.scandir(self.dir):
+            if entry.is_file() and entry.name.endswith((".wav.z", ".mp3")):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._lru[name.split(".", 1)[0]] = (name, size)
+            self._bytes += size
+        logger.info(f"TTS 音频缓存: {self.dir}（{len(self._lru)} 条，{self._bytes // 1024} KB）")
+
+    @staticmethod
+    def key(text, engine, speaker=None, speed=None, rate=None):
+        speed = None if speed is None else f"{float(speed):g}"
+        h = hashlib.blake2b(digest_size=16)
+        h.update("\0".join(str(v) for v in (engine, speaker, speed, rate, text)).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, text, engine, speaker=None, speed=None, rate=None):
+        """返回缓存的音频字节（WAV 或 MP3），没有则返回 None"""
+        key = self.key(text, engine, speaker, speed, rate)
+        with self._lock:
+            item = self._lru.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(key)
+        name = item[0]
+        path = self.dir / name
+        try:
+            data = path.read_bytes()
+            if name.endswith(".z"):
+                data = zlib.decompress(data)
+            os.utime(path)
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"TTS 缓存文件损坏，已丢弃: {name} ({e})")
+            self._discard(key)
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, text, engine, data, speaker=None, speed=None, rate=None):
+        if not data:
+            return
+        key = self.key(text, engine, speaker, speed, rate)
+        is_wav = data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+        name = key + (".wav.z" if is_wav else ".mp3")
+        payload = zlib.compress(data, self.level) if is_wav else data
+        tmp = self.dir / (name + ".tmp")
+        try:
+            tmp.write_bytes(payload)
+            os.replace(tmp, self.dir / name)
+        except OSError as e:
+            logger.warning(f"写入 TTS 缓存失败: {e}")
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+                if old[0] != name:
+                    (self.dir / old[0]).unlink(missing_ok=True)
+            self._lru[key] = (name, len(payload))
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                _, (old_name, size) = self._lru.popitem(last=False)
+                self._bytes -= size
+                (self.dir / old_name).unlink(missing_ok=True)
+
+    def _discard(self, key):
+        with self._lock:
+            item = self._lru.pop(key, None)
+            if item is not None:
+                self._bytes -= item[1]
+                (self.dir / item[0]).unlink(missing_ok=True)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
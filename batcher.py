@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+from loguru import logger
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before it reached the model."""
+
+
+class MicroBatcher:
+    """Queue in front of a MangaOcr that merges concurrent requests into batches.
+
+    Requests that arrive within ``window_ms`` of the first queued one (or until
+    ``max_batch`` images are waiting) are run through a single ``mocr.batch``
+    call; every caller gets its own result back through a Future. Requests
+    whose ``deadline`` (a ``time.monotonic()`` value) has passed by the time
+    their batch is formed are failed with DeadlineExceeded instead of being run.
+
+    ``on_batch(size, stats)`` is called after every batch with the ``stats``
+    dict filled in by ``mocr.batch``.
+    """
+
+    def __init__(self, mocr, window_ms=10, max_batch=8, on_batch=None):
+        self.mocr = mocr
+        self.on_batch = on_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, deadline=None):
+        future = Future()
+        self._queue.put((image, future, deadline))
+        return future
+
+    def __call__(self, image, timeout=None):
+        return self.submit(image).result(timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                # Put the sentinel back so the loop exits after this batch.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            items = self._collect(first)
+            now = time.monotonic()
+            batch = []
+            for image, future, deadline in items:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if deadline is not None and deadline <= now:
+                    future.set_exception(DeadlineExceeded())
+                    continue
+                batch.append((image, future))
+            if not batch:
+                continue
+
+            stats = {}
+            try:
+                results = self.mocr.batch([image for image, _ in batch], batch_size=len(batch), stats=stats)
+            except Exception as e:
+                logger.exception(f"Batched OCR failed for {len(batch)} images")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            if self.on_batch is not None:
+                self.on_batch(len(batch), stats)
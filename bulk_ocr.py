@@ -0,0 +1,203 @@
+"""Offline OCR of ZIP comic archives and image folders into JSONL.
+
+    python bulk_ocr.py E:/comics/*.zip --output ocr.jsonl
+
+Every output line is one text region: {"archive", "page", "index", "box",
+"text"}; a page that cannot be read or decoded gets a single {"archive",
+"page", "error"} line instead. A page's lines are written together once all
+its regions are done, and its key is then appended to the checkpoint file
+(``<output>.ckpt`` by default). Re-running the same command skips
+checkpointed pages, so an interrupted job continues where it stopped; output
+lines of a page whose checkpoint entry was never written are cut off first.
+"""
+import io
+import os
+import json
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import natsort as ns
+from PIL import Image
+from loguru import logger
+from page_ocr import detect_text_regions, IMAGE_EXTS
+
+
+def iter_pages(sources):
+    """Yield ``(archive, page, read)`` for every image, natsorted like comic_reader.
+
+    ``read()`` returns the encoded image bytes. Folders are walked
+    recursively; ZIPs found inside folders are opened as archives.
+    """
+    for source in map(Path, sources):
+        if source.is_dir():
+            files = [p for p in source.rglob("*") if p.is_file()]
+            images = ns.natsorted([p for p in files if p.suffix.lower() in IMAGE_EXTS], alg=ns.IGNORECASE | ns.PATH)
+            for path in images:
+                yield str(source), path.relative_to(source).as_posix(), path.read_bytes
+            archives = ns.natsorted([p for p in files if p.suffix.lower() == ".zip"], alg=ns.IGNORECASE | ns.PATH)
+            yield from iter_pages(archives)
+        elif source.suffix.lower() == ".zip":
+            with zipfile.ZipFile(source, "r") as zf:
+                names = [n for n in zf.namelist() if n.lower().endswith(IMAGE_EXTS)]
+                for name in ns.natsorted(names, alg=ns.IGNORECASE | ns.PATH):
+                    yield str(source), name, lambda zf=zf, name=name: zf.read(name)
+        elif source.suffix.lower() in IMAGE_EXTS:
+            yield str(source.parent), source.name, source.read_bytes
+
+
+def decode_page(data):
+    """Decode and detect regions; runs on the worker pool."""
+    gray = Image.open(io.BytesIO(data)).convert("L")
+    return gray, detect_text_regions(gray)
+
+
+class BulkOcr:
+    def __init__(self, mocr, output, checkpoint, batch_size=16, workers=4, prefetch=8):
+        self.mocr = mocr
+        self.batch_size = batch_size
+        self.workers = workers
+        self.prefetch = prefetch
+        self.checkpoint_path = Path(checkpoint)
+        self.done = set()
+        if self.checkpoint_path.exists():
+            text = self.checkpoint_path.read_text(encoding="utf-8")
+            if text and not text.endswith("\n"):
+                # A half-written key would be glued to the next one; drop it.
+                text = text[:text.rfind("\n") + 1]
+                self.checkpoint_path.write_text(text, encoding="utf-8")
+            self.done = set(text.splitlines())
+            logger.info(f"Resuming: {len(self.done)} pages already done")
+        self._truncate_unfinished(Path(output))
+        self.output = open(output, "a", encoding="utf-8")
+        self.checkpoint = open(self.checkpoint_path, "a", encoding="utf-8")
+        self.regions = []  # (page key, region index, crop) waiting for a batch
+        self.pages = {}    # page key -> (archive, page, boxes, texts, remaining)
+
+    @staticmethod
+    def page_key(archive, page):
+        return f"{archive}::{page}"
+
+    def _truncate_unfinished(self, path):
+        """Cut the output after the last record of a checkpointed page.
+
+        Pages are written one after another and checkpointed right after, so
+        records of a page missing from the checkpoint (killed between the two
+        writes) or a half-written line can only be at the end of the file.
+        """
+        if not path.exists():
+            return
+        keep = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n") or self.page_key(record["archive"], record["page"]) not in self.done:
+                    break
+                keep += len(line)
+        size = path.stat().st_size
+        if keep < size:
+            logger.warning(f"Dropping {size - keep} bytes of output from an unfinished page")
+            with open(path, "r+b") as f:
+                f.truncate(keep)
+
+    def run(self, sources):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr-decode") as pool:
+            pending = deque()
+            for archive, page, read in iter_pages(sources):
+                if self.page_key(archive, page) in self.done:
+                    continue
+                # Reading stays on this thread (ZipFile handles are shared); decoding goes to the pool.
+                try:
+                    data = read()
+                except Exception as e:
+                    self.fail_page(archive, page, f"failed to read: {e}")
+                    continue
+                pending.append((archive, page, pool.submit(decode_page, data)))
+                if len(pending) >= self.prefetch:
+                    self.add_page(*pending.popleft())
+            while pending:
+                self.add_page(*pending.popleft())
+        self.flush()
+        self.output.close()
+        self.checkpoint.close()
+
+    def add_page(self, archive, page, future):
+        key = self.page_key(archive, page)
+        try:
+            gray, boxes = future.result()
+        except Exception as e:
+            self.fail_page(archive, page, f"failed to decode: {e}")
+            return
+        self.pages[key] = (archive, page, boxes, [None] * len(boxes), len(boxes))
+        if not boxes:
+            self.finish_page(key)
+        for index, box in enumerate(boxes):
+            self.regions.append((key, index, gray.crop(box)))
+        while len(self.regions) >= self.batch_size:
+            self.ocr_regions(self.batch_size)
+
+    def flush(self):
+        while self.regions:
+            self.ocr_regions(self.batch_size)
+
+    def ocr_regions(self, count):
+        """OCR the oldest ``count`` queued regions; regions of one page may span batches."""
+        batch, self.regions = self.regions[:count], self.regions[count:]
+        texts = self.mocr.batch([crop for _, _, crop in batch], batch_size=self.batch_size)
+        for (key, index, _), text in zip(batch, texts):
+            archive, page, boxes, results, remaining = self.pages[key]
+            results[index] = text
+            self.pages[key] = (archive, page, boxes, results, remaining - 1)
+            if remaining == 1:
+                self.finish_page(key)
+
+    def finish_page(self, key):
+        archive, page, boxes, texts, _ = self.pages.pop(key)
+        self.commit_page(key, [
+            {"archive": archive, "page": page, "index": index, "box": list(box), "text": text}
+            for index, (box, text) in enumerate(zip(boxes, texts))
+        ])
+        logger.info(f"{key}: {len(boxes)} regions")
+
+    def fail_page(self, archive, page, error):
+        """Record an unreadable page so it is reported once instead of retried on every resume."""
+        key = self.page_key(archive, page)
+        logger.error(f"{key}: {error}")
+        self.commit_page(key, [{"archive": archive, "page": page, "error": error}])
+
+    def commit_page(self, key, records):
+        for record in records:
+            self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.checkpoint.write(key + "\n")
+        self.checkpoint.flush()
+        os.fsync(self.checkpoint.fileno())
+        self.done.add(key)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="ZIP archives, image folders or images")
+    parser.add_argument("--output", default="ocr.jsonl")
+    parser.add_argument("--checkpoint", help="defaults to <output>.ckpt")
+    parser.add_argument("--model", default="kha-white/manga-ocr-base")
+    parser.add_argument("--onnx", help="use an exported ONNX model directory instead of --model")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="decode/detect threads")
+    parser.add_argument("--prefetch", type=int, default=8, help="pages decoded ahead of OCR")
+    args = parser.parse_args()
+
+    if args.onnx:
+        from ocr_onnx import OnnxMangaOcr
+        mocr = OnnxMangaOcr(args.onnx)
+    else:
+        import ocr
+        mocr = ocr.MangaOcr(pretrained_model_name_or_path=args.model)
+    BulkOcr(mocr, args.output, args.checkpoint or args.output + ".ckpt",
+            batch_size=args.batch_size, workers=args.workers, prefetch=args.prefetch).run(args.sources)
@@ -30,9 +30,28 @@ session = None
 keepbuffer=3
 recent_buffer_tts = RecentCache(capacity=keepbuffer)
 recent_buffer_translate = RecentCache(capacity=keepbuffer)
-def lookup_translation_cache(text: str):
-    """从翻译缓存中查找文本的翻译结果"""
-    return recent_buffer_translate.get(text)
+translation_memory = None
+audio_cache = None  # audio_cache.AudioCache，由调用方设置；持久化 TTS 结果
+def set_translation_memory(db_path=None, max_mb=64):
+    """启用持久化翻译记忆库（sqlite），跨会话复用已翻译过的句子；db_path 为空则关闭"""
+    global translation_memory
+    from translation_memory import TranslationMemory
+    translation_memory = TranslationMemory(db_path, max_bytes=max_mb * 1024 * 1024) if db_path else None
+def lookup_translation_cache(text: str, provider=None):
+    """从翻译缓存中查找文本的翻译结果；先查最近缓存，再查翻译记忆库（可近似匹配）"""
+    buffer_res = recent_buffer_translate.get(text)
+    if buffer_res is not None:
+        return buffer_res
+    if translation_memory is not None:
+        memory_res = translation_memory.get(text, provider)
+        if memory_res is not None:
+            recent_buffer_translate.put(text, memory_res)
+            return memory_res
+    return None
+def remember_translation(text: str, provider: str, translated_text: str):
+    recent_buffer_translate.put(text, translated_text)
+    if translation_memory is not None:
+        translation_memory.put(text, provider, translated_text)
 def get_session():
     global session
     if session is None:
@@ -49,6 +68,10 @@ def japanese_tts(text: str) -> BytesIO:
     text = text.strip()
     global recent_buffer_tts
     buffer_res= recent_buffer_tts.get(text)
+    if buffer_res is None and audio_cache is not None:
+        buffer_res = audio_cache.get(text, "gtts")
+        if buffer_res is not None:
+            recent_buffer_tts.put(text, buffer_res)
     if buffer_res is not None:
         print("使用缓存的 TTS 结果")
         return BytesIO(buffer_res)
@@ -66,11 +89,12 @@ def japanese_tts(text: str) -> BytesIO:
     response = session.get(url, params=params)
     response.raise_for_status()
     recent_buffer_tts.put(text,response.content)
+    if audio_cache is not None:
+        audio_cache.put(text, "gtts", response.content)
     output=BytesIO(response.content)
     return output
 def translate_with_api_key(text="Hello, world!", target="zh-CN", api_key="YOUR_API_KEY_HERE"):
-    global recent_buffer_translate
-    buffer_res= recent_buffer_translate.get(text)
+    buffer_res= lookup_translation_cache(text, "google")
     if buffer_res is not None:
         print("使用缓存的翻译结果")
         return buffer_res
@@ -86,7 +110,7 @@ def translate_with_api_key(text="Hello, world!", target="zh-CN", api_key="YOUR_A
     
     result = response.json()
     translated_text = result["data"]["translations"][0]["translatedText"]
-    recent_buffer_translate.put(text, translated_text)
+    remember_translation(text, "google", translated_text)
     return translated_text
 
 __ai_client = None
@@ -98,6 +122,10 @@ def set_ai_client(base_url=None):
     )
     
 def translate_with_local_model(text="Hello, world!"):
+    buffer_res= lookup_translation_cache(text, "local")
+    if buffer_res is not None:
+        print("使用缓存的翻译结果")
+        return buffer_res
     client = __ai_client
     if client is None:
         raise ValueError("AI client not set. Please call set_ai_client() first.")
@@ -115,6 +143,7 @@ def translate_with_local_model(text="Hello, world!"):
     )
 
     translated_text = response.choices[0].message.content
+    remember_translation(text, "local", translated_text)
     return translated_text
 def translate_with_local_model_stream(text="Hello, world!"):
     client = __ai_client
@@ -151,7 +180,7 @@ def set_ali_ai_client(api_key=None):
         base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
     )
 def translate_with_ali(text="Hello, world!", source_lang="Japanese", target_lang="Chinese"):
-    buffer_res= recent_buffer_translate.get(text)
+    buffer_res= lookup_translation_cache(text, "ali")
     if buffer_res is not None:
         print("使用缓存的翻译结果")
         return buffer_res
@@ -178,7 +207,7 @@ def translate_with_ali(text="Hello, world!", source_lang="Japanese", target_lang
     )
 
     translated_text = response.choices[0].message.content
-    recent_buffer_translate.put(text, translated_text)
+    remember_translation(text, "ali", translated_text)
     return translated_text
 
 if __name__ == "__main__":
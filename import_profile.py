@@ -0,0 +1,56 @@
+"""Show which modules dominate import time, using ``python -X importtime``.
+
+    python import_profile.py ocr
+    python import_profile.py ocrserver --top 30
+
+Times are grouped by top-level package; "self" is time spent in the
+package's own module bodies and "cumulative" includes what they import.
+"""
+import re
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module):
+    """Return ``(name, self_us, cumulative_us, depth)`` for every module imported by ``module``."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def by_package(rows):
+    totals = defaultdict(lambda: [0, 0])
+    for name, self_us, cumulative_us, depth in rows:
+        package = name.split(".")[0]
+        totals[package][0] += self_us
+        # Only count a package's outermost import once in its cumulative time.
+        if name == package or depth == 0:
+            totals[package][1] = max(totals[package][1], cumulative_us)
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="ocr")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    total = next((cumulative for name, _, cumulative, _ in rows if name == args.module), 0)
+    print(f"import {args.module}: {total / 1e6:.2f}s total, {len(rows)} modules")
+    print(f"{'package':<30}{'self ms':>12}{'cumulative ms':>16}")
+    totals = sorted(by_package(rows).items(), key=lambda kv: kv[1][0], reverse=True)
+    for package, (self_us, cumulative_us) in totals[:args.top]:
+        print(f"{package:<30}{self_us / 1000:>12.1f}{cumulative_us / 1000:>16.1f}")
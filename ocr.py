@@ -1,22 +1,79 @@
-import re
+import copy
+import time
+import threading
 from pathlib import Path
 
-import jaconv
-import torch
 from PIL import Image
 from loguru import logger
-from transformers import ViTImageProcessor, AutoTokenizer, VisionEncoderDecoderModel, GenerationMixin
+from ocr_post import post_process, estimate_max_new_tokens, row_decode_steps
+from ocr_pre import load_gray, normalize_into
 
+# torch and transformers take seconds to import, so they are only imported
+# once a model is actually built (see _model_class and MangaOcr.__init__).
+
+
+TEST_IMAGES = Path(__file__).parent / "test_data" / "images"
+
+# fp32: eager full precision. int8: dynamic int8 quantization of the decoder's
+# Linear layers (CPU only). compile: torch.compile'd encoder and decoder.
+BACKENDS = ("fp32", "int8", "compile")
+
+# Inference stages timed by MangaOcr.batch(stats=...).
+STAGES = ("preprocess", "encoder", "decode_loop", "tokenizer_decode", "post_process")
+
+
+_MODEL_CLASS = None
+
+
+def _model_class():
+    global _MODEL_CLASS
+    if _MODEL_CLASS is None:
+        from transformers import VisionEncoderDecoderModel, GenerationMixin
+
+        class MangaOcrModel(VisionEncoderDecoderModel, GenerationMixin):
+            pass
+
+        _MODEL_CLASS = MangaOcrModel
+    return _MODEL_CLASS
+
+
+def __getattr__(name):
+    # Keeps ``from ocr import MangaOcrModel`` working without importing transformers up front.
+    if name == "MangaOcrModel":
+        return _model_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _apply_backend(model, backend):
+    import torch
+
+    if backend == "fp32":
+        return model
+    if backend == "int8":
+        if model.device.type != "cpu":
+            raise ValueError(f"int8 backend only runs on CPU, model is on {model.device}")
+        model.decoder = torch.ao.quantization.quantize_dynamic(model.decoder, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+    if backend == "compile":
+        model.encoder.forward = torch.compile(model.encoder.forward, dynamic=True)
+        model.decoder.forward = torch.compile(model.decoder.forward, dynamic=True)
+        return model
+    raise ValueError(f"backend must be one of {BACKENDS}, instead got: {backend}")
 
-class MangaOcrModel(VisionEncoderDecoderModel, GenerationMixin):
-    pass
 
 class MangaOcr:
-    def __init__(self, pretrained_model_name_or_path="kha-white/manga-ocr-base", force_cpu=False,local_files_only=True):
+    def __init__(self, pretrained_model_name_or_path="kha-white/manga-ocr-base", force_cpu=False,local_files_only=True, cache=None, backend="fp32", preprocess="fast"):
+        self.cache = cache
+        # "fast": single resize + vectorized normalize (see ocr_pre.normalize_into).
+        # "processor": the original ViTImageProcessor path.
+        self.preprocess = preprocess
+        import torch
+        from transformers import ViTImageProcessor, AutoTokenizer
+
         logger.info(f"Loading OCR model from {pretrained_model_name_or_path}")
         self.processor = ViTImageProcessor.from_pretrained(pretrained_model_name_or_path,local_files_only=local_files_only)
         self.tokenizer = AutoTokenizer.from_pretrained(pretrained_model_name_or_path,local_files_only=local_files_only,use_fast=False)
-        self.model = MangaOcrModel.from_pretrained(pretrained_model_name_or_path,local_files_only=local_files_only)
+        self.model = _model_class().from_pretrained(pretrained_model_name_or_path,local_files_only=local_files_only)
         if not force_cpu and torch.cuda.is_available():
             logger.info("Using CUDA")
             self.model.cuda()
@@ -26,33 +83,246 @@ class MangaOcr:
         else:
             logger.info("Using CPU")
 
-        logger.info("OCR ready")
+        self.backend = backend
+        self.model = _apply_backend(self.model, backend)
+        logger.info(f"OCR ready ({backend})")
 
-    def __call__(self, img_or_path):
-        if isinstance(img_or_path, str) or isinstance(img_or_path, Path):
-            img = Image.open(img_or_path)
-        elif isinstance(img_or_path, Image.Image):
-            img = img_or_path
-        else:
-            raise ValueError(f"img_or_path must be a path or PIL.Image, instead got: {img_or_path}")
+    def with_backend(self, backend):
+        """Copy of this fp32 instance running ``backend``, sharing processor and tokenizer.
+
+        The copy has no cache, so it always runs the model.
+        """
+        if self.backend != "fp32":
+            raise ValueError(f"with_backend needs an fp32 instance, this one is {self.backend}")
+        clone = copy.copy(self)
+        clone.cache = None
+        clone.backend = backend
+        clone.model = _apply_backend(copy.deepcopy(self.model), backend)
+        return clone
+
+    def model_bytes(self):
+        """Bytes held by the model's parameters and buffers (packed int8 weights are not counted)."""
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def __call__(self, img_or_path, max_new_tokens=None, stats=None):
+        return self.batch([img_or_path], batch_size=1, max_new_tokens=max_new_tokens, stats=stats)[0]
+
+    def batch(self, images, batch_size=8, max_new_tokens=None, stats=None):
+        """OCR a list of images, paths or NumPy arrays, returning the texts in input order.
+
+        Crops already in ``self.cache`` skip inference entirely. The rest are
+        preprocessed in one call, by ``normalize_into`` (``preprocess="fast"``,
+        bypassing ``ViTImageProcessor``) or by the processor. Then, per chunk of
+        ``batch_size`` images, the encoder runs once on its own and
+        ``model.generate`` decodes from its outputs.
+
+        Decoding is greedy with the KV cache. Each chunk is capped at
+        ``max_new_tokens``, or by default at what its largest crop can hold
+        (see ``estimate_max_new_tokens``); finished rows are padded and the
+        loop stops once every row has emitted EOS. If ``stats`` is a dict it
+        receives ``decode_steps`` (loop iterations over all chunks),
+        ``row_steps`` (tokens generated per image, None for cache hits) and
+        ``timings`` (seconds spent in each of ``STAGES``).
+        """
+        import torch
+
+        timings = dict.fromkeys(STAGES, 0.0)
+        images = [load_gray(img) for img in images]
+        results = [None] * len(images)
+        keys = [None] * len(images)
+        if self.cache is not None:
+            for i, img in enumerate(images):
+                keys[i] = self.cache.key(img)
+                results[i] = self.cache.get(keys[i])
+        todo = [i for i, result in enumerate(results) if result is None]
+        row_steps = [None] * len(images)
+        decode_steps = 0
+        if todo:
+            t = time.perf_counter()
+            pixel_values = self._preprocess([images[i] for i in todo])
+            timings["preprocess"] += time.perf_counter() - t
+        for start in range(0, len(todo), batch_size):
+            chunk = todo[start:start + batch_size]
+            limit = max_new_tokens or max(estimate_max_new_tokens(images[i].size) for i in chunk)
+            x = pixel_values[start:start + batch_size].to(self.model.device)
+
+            # The encoder runs once up front so its cost can be told apart from the decode loop.
+            t = time.perf_counter()
+            # no_grad, not inference_mode: generate() runs outside it and may not
+            # touch inference tensors, e.g. when expanding the encoder states.
+            with torch.no_grad():
+                encoder_outputs = self.model.get_encoder()(pixel_values=x, return_dict=True)
+            timings["encoder"] += time.perf_counter() - t
+
+            t = time.perf_counter()
+            x = self.model.generate(
+                x,
+                encoder_outputs=encoder_outputs,
+                max_new_tokens=limit,
+                do_sample=False,
+                num_beams=1,
+                use_cache=True,
+                eos_token_id=self.model.config.eos_token_id,
+                pad_token_id=self.model.config.pad_token_id,
+            ).cpu()
+            timings["decode_loop"] += time.perf_counter() - t
+
+            generated = x[:, 1:].tolist()  # drop decoder_start_token_id
+            decode_steps += len(generated[0])
+            for i, steps in zip(chunk, row_decode_steps(generated, self.model.config.eos_token_id)):
+                row_steps[i] = steps
+
+            t = time.perf_counter()
+            texts = self.tokenizer.batch_decode(x, skip_special_tokens=True)
+            timings["tokenizer_decode"] += time.perf_counter() - t
+
+            t = time.perf_counter()
+            for i, text in zip(chunk, texts):
+                results[i] = post_process(text)
+            timings["post_process"] += time.perf_counter() - t
+            if self.cache is not None:
+                for i in chunk:
+                    self.cache.put(keys[i], results[i])
+        if stats is not None:
+            stats["decode_steps"] = decode_steps
+            stats["row_steps"] = row_steps
+            stats["timings"] = timings
+        return results
+
+    def _preprocess(self, images):
+        import torch
+
+        if self.preprocess == "processor":
+            return self.processor([img.convert("RGB") for img in images], return_tensors="pt").pixel_values
+
+        size = self.processor.size
+        out = torch.empty((len(images), 3, size["height"], size["width"]), dtype=torch.float32)
+        normalize_into(images, out.numpy(), (size["width"], size["height"]),
+                       self.processor.image_mean, self.processor.image_std, self.processor.resample)
+        return out
+
+
+class LazyMangaOcr:
+    """Builds a MangaOcr on a background thread so the caller can start serving first.
+
+    ``factory`` returns the engine (a MangaOcr, OnnxMangaOcr, ...). After it is
+    built, one dummy inference warms up the kernels. Until then ``state`` is
+    "loading". Calls block on ``wait()``, which raises if loading failed.
+    """
+
+    def __init__(self, factory, warmup=True):
+        self._factory = factory
+        self._warmup = warmup
+        self._ready = threading.Event()
+        self._cache = None
+        self.mocr = None
+        self.error = None
+        self.load_seconds = None
+
+    def start(self):
+        threading.Thread(target=self.load, name="ocr-loader", daemon=True).start()
+        return self
+
+    def load(self):
+        start = time.perf_counter()
+        try:
+            mocr = self._factory()
+            if self._warmup:
+                mocr.cache = None  # keep the blank warm-up image out of the cache
+                mocr(Image.new("L", (64, 64), 255))
+            mocr.cache = self._cache
+            self.mocr = mocr
+            self.load_seconds = time.perf_counter() - start
+            logger.info(f"OCR loaded and warmed up in {self.load_seconds:.1f}s")
+        except Exception as e:
+            self.error = e
+            logger.exception("OCR model failed to load")
+        finally:
+            self._ready.set()
+        return self
+
+    @property
+    def state(self):
+        if not self._ready.is_set():
+            return "loading"
+        return "failed" if self.error is not None else "ready"
+
+    def is_ready(self):
+        return self.state == "ready"
+
+    def wait_ready(self, timeout=None):
+        """Block until loading finished; False if ``timeout`` ran out first."""
+        return self._ready.wait(timeout)
+
+    def wait(self, timeout=None):
+        if not self._ready.wait(timeout):
+            raise TimeoutError("OCR model is still loading")
+        if self.error is not None:
+            raise RuntimeError("OCR model failed to load") from self.error
+        return self.mocr
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache):
+        self._cache = cache
+        if self.mocr is not None:
+            self.mocr.cache = cache
+
+    def __call__(self, *args, **kwargs):
+        return self.wait()(*args, **kwargs)
+
+    def batch(self, *args, **kwargs):
+        return self.wait().batch(*args, **kwargs)
+
+
+def self_check(mocr, backends=BACKENDS, images_dir=TEST_IMAGES, batch_size=8):
+    """Compare every backend's output against fp32 on the images in ``images_dir``.
 
-        img = img.convert("L").convert("RGB")
+    ``mocr`` must be an fp32 instance. Returns one dict per backend with its
+    warm wall time over all images and the fraction of outputs identical to fp32.
+    Raises RuntimeError if fp32 itself fails, since nothing could be verified.
+    """
+    paths = sorted(Path(images_dir).glob("*.jpg"))
+    images = [Image.open(path).convert("L") for path in paths]
+    reference = None
+    report = []
+    for backend in ("fp32",) + tuple(b for b in backends if b != "fp32"):
+        try:
+            engine = mocr.with_backend(backend)
+            engine.batch(images[:1])  # warm-up; compiles the graph for "compile"
+            start = time.perf_counter()
+            texts = engine.batch(images, batch_size=batch_size)
+            seconds = time.perf_counter() - start
+        except Exception as e:
+            if backend == "fp32":
+                raise RuntimeError("fp32 reference failed self-check; no backend can be verified") from e
+            logger.warning(f"Backend {backend} failed self-check: {e}")
+            report.append({"backend": backend, "seconds": None, "match_rate": 0.0, "error": str(e)})
+            continue
+        if reference is None:
+            reference = texts
+        matches = sum(a == b for a, b in zip(texts, reference))
+        report.append({"backend": backend, "seconds": seconds, "match_rate": matches / max(1, len(texts))})
+        logger.info(f"Backend {backend}: {seconds:.2f}s, {matches}/{len(texts)} match fp32")
+    return report
 
-        x = self._preprocess(img)
-        x = self.model.generate(x[None].to(self.model.device), max_length=300)[0].cpu()
-        x = self.tokenizer.decode(x, skip_special_tokens=True)
-        x = post_process(x)
-        return x
 
-    def _preprocess(self, img):
-        pixel_values = self.processor(img, return_tensors="pt").pixel_values
-        return pixel_values.squeeze()
+def auto_backend(pretrained_model_name_or_path, min_match_rate=1.0, force_cpu=True, local_files_only=True):
+    """Load an fp32 model, self-check every backend and return the name select_backend picks.
 
+    Meant to run in a throwaway process (see ocrserver.build_model), so the
+    caller never runs inference or starts torch thread pools itself.
+    """
+    mocr = MangaOcr(pretrained_model_name_or_path=pretrained_model_name_or_path, force_cpu=force_cpu,
+                    local_files_only=local_files_only)
+    return select_backend(self_check(mocr), min_match_rate=min_match_rate)
 
-def post_process(text):
-    text = "".join(text.split())
-    text = text.replace("…", "...")
-    text = re.sub("[・.]{2,}", lambda x: (x.end() - x.start()) * ".", text)
-    text = jaconv.h2z(text, ascii=True, digit=True)
 
-    return text
+def select_backend(report, min_match_rate=1.0):
+    """Fastest backend in a self_check report that is still accurate enough."""
+    candidates = [r for r in report if r["seconds"] is not None and r["match_rate"] >= min_match_rate]
+    return min(candidates, key=lambda r: r["seconds"])["backend"]
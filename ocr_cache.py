@@ -0,0 +1,89 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from loguru import logger
+
+
+class OcrCache:
+    """OCR results keyed by a hash of the crop's grayscale pixels.
+
+    Entries live in an in-memory LRU bounded by ``max_bytes``; when ``db_path``
+    is given they are also written to a sqlite file so they survive restarts.
+    """
+
+    # Rough per-entry bookkeeping cost of the OrderedDict node, key and str objects.
+    ENTRY_OVERHEAD = 128
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, db_path=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS ocr_cache (key BLOB PRIMARY KEY, text TEXT NOT NULL)")
+            self._db.commit()
+            logger.info(f"OCR cache database: {db_path}")
+
+    @staticmethod
+    def key(img):
+        """Content hash of ``img`` after normalizing it to 8-bit grayscale."""
+        if img.mode != "L":
+            img = img.convert("L")
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{img.width}x{img.height}".encode())
+        h.update(img.tobytes())
+        return h.digest()
+
+    def get(self, key):
+        with self._lock:
+            text = self._lru.get(key)
+            if text is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return text
+            if self._db is not None:
+                row = self._db.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO ocr_cache (key, text) VALUES (?, ?)", (key, text))
+                self._db.commit()
+
+    def _remember(self, key, text):
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self._bytes -= self._cost(key, old)
+        self._lru[key] = text
+        self._bytes += self._cost(key, text)
+        while self._bytes > self.max_bytes and self._lru:
+            old_key, old_text = self._lru.popitem(last=False)
+            self._bytes -= self._cost(old_key, old_text)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def _cost(self, key, text):
+        return len(key) + len(text.encode("utf-8")) + self.ENTRY_OVERHEAD
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
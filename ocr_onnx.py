@@ -0,0 +1,239 @@
+"""ONNX Runtime engine for the manga-ocr model.
+
+Export once with torch/transformers installed:
+
+    python ocr_onnx.py export --model kha-white/manga-ocr-base --out onnx_model
+
+After that ``OnnxMangaOcr("onnx_model")`` only needs onnxruntime, numpy and
+Pillow; it never imports torch or transformers.
+"""
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from ocr_post import post_process, estimate_max_new_tokens, row_decode_steps
+from ocr_pre import load_gray, normalize_into
+from ocr import STAGES
+
+META_FILE = "manga_ocr_onnx.json"
+ENCODER_FILE = "encoder.onnx"
+DECODER_FILE = "decoder.onnx"
+DECODER_WITH_PAST_FILE = "decoder_with_past.onnx"
+# Per decoder layer: self-attention key/value, then cross-attention key/value.
+KV_NAMES = ("self_key", "self_value", "cross_key", "cross_value")
+
+
+def export(pretrained_model_name_or_path, out_dir, local_files_only=True, opset=17):
+    """Export the encoder and the KV-cached decoder of a manga-ocr checkpoint to ONNX."""
+    import torch
+    from ocr import _model_class
+    from transformers import ViTImageProcessor, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    processor = ViTImageProcessor.from_pretrained(pretrained_model_name_or_path, local_files_only=local_files_only)
+    tokenizer = AutoTokenizer.from_pretrained(pretrained_model_name_or_path, local_files_only=local_files_only, use_fast=False)
+    model = _model_class().from_pretrained(pretrained_model_name_or_path, local_files_only=local_files_only).eval()
+    processor.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+
+    num_layers = model.decoder.config.num_hidden_layers
+
+    class Encoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.encoder = model.encoder
+            self.proj = getattr(model, "enc_to_dec_proj", None)
+
+        def forward(self, pixel_values):
+            hidden = self.encoder(pixel_values=pixel_values).last_hidden_state
+            return self.proj(hidden) if self.proj is not None else hidden
+
+    class Decoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = model.decoder
+
+        def forward(self, input_ids, encoder_hidden_states, *past):
+            past_key_values = tuple(tuple(past[i:i + 4]) for i in range(0, len(past), 4)) or None
+            out = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states,
+                               past_key_values=past_key_values, use_cache=True, return_dict=True)
+            return (out.logits,) + tuple(t for layer in out.past_key_values for t in layer)
+
+    size = processor.size
+    pixel_values = torch.zeros(1, 3, size["height"], size["width"])
+    input_ids = torch.full((1, 1), model.config.decoder_start_token_id, dtype=torch.long)
+    kv_names = [f"{i}_{name}" for i in range(num_layers) for name in KV_NAMES]
+    past_axes = {f"past_{n}": {0: "batch", 2: "past_seq" if "self" in n else "enc_seq"} for n in kv_names}
+    present_axes = {f"present_{n}": {0: "batch", 2: "seq" if "self" in n else "enc_seq"} for n in kv_names}
+
+    with torch.no_grad():
+        encoder, decoder = Encoder().eval(), Decoder().eval()
+        torch.onnx.export(encoder, (pixel_values,), out_dir / ENCODER_FILE, opset_version=opset,
+                          input_names=["pixel_values"], output_names=["encoder_hidden_states"],
+                          dynamic_axes={"pixel_values": {0: "batch"}, "encoder_hidden_states": {0: "batch"}})
+        hidden = encoder(pixel_values)
+
+        torch.onnx.export(decoder, (input_ids, hidden), out_dir / DECODER_FILE, opset_version=opset,
+                          input_names=["input_ids", "encoder_hidden_states"],
+                          output_names=["logits"] + [f"present_{n}" for n in kv_names],
+                          dynamic_axes={"input_ids": {0: "batch", 1: "seq"},
+                                        "encoder_hidden_states": {0: "batch"},
+                                        "logits": {0: "batch", 1: "seq"}, **present_axes})
+        past = decoder(input_ids, hidden)[1:]
+
+        torch.onnx.export(decoder, (input_ids, hidden) + past, out_dir / DECODER_WITH_PAST_FILE, opset_version=opset,
+                          input_names=["input_ids", "encoder_hidden_states"] + [f"past_{n}" for n in kv_names],
+                          output_names=["logits"] + [f"present_{n}" for n in kv_names],
+                          dynamic_axes={"input_ids": {0: "batch"}, "encoder_hidden_states": {0: "batch"},
+                                        "logits": {0: "batch"}, **past_axes, **present_axes})
+
+    meta = {
+        "num_layers": num_layers,
+        "decoder_start_token_id": model.config.decoder_start_token_id,
+        "eos_token_id": model.config.eos_token_id,
+        "pad_token_id": model.config.pad_token_id,
+        "special_token_ids": sorted(tokenizer.all_special_ids),
+    }
+    (out_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    logger.info(f"Exported ONNX model to {out_dir}")
+
+
+class OnnxMangaOcr:
+    """Drop-in replacement for ``ocr.MangaOcr`` running an exported model on ONNX Runtime (CPU)."""
+
+    def __init__(self, model_dir, cache=None, intra_op_threads=0):
+        import onnxruntime as ort
+
+        model_dir = Path(model_dir)
+        self.cache = cache
+        logger.info(f"Loading ONNX OCR model from {model_dir}")
+        self.meta = json.loads((model_dir / META_FILE).read_text(encoding="utf-8"))
+        self.vocab = (model_dir / "vocab.txt").read_text(encoding="utf-8").splitlines()
+        self.special_ids = set(self.meta["special_token_ids"])
+
+        config = json.loads((model_dir / "preprocessor_config.json").read_text(encoding="utf-8"))
+        self.size = (config["size"]["width"], config["size"]["height"])
+        self.mean = config["image_mean"]
+        self.std = config["image_std"]
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        providers = ["CPUExecutionProvider"]
+        self.encoder = ort.InferenceSession(str(model_dir / ENCODER_FILE), options, providers=providers)
+        self.decoder = ort.InferenceSession(str(model_dir / DECODER_FILE), options, providers=providers)
+        self.decoder_with_past = ort.InferenceSession(str(model_dir / DECODER_WITH_PAST_FILE), options, providers=providers)
+        self.kv_names = [f"{i}_{name}" for i in range(self.meta["num_layers"]) for name in KV_NAMES]
+        logger.info("ONNX OCR ready")
+
+    def __call__(self, img_or_path, max_new_tokens=None, stats=None):
+        return self.batch([img_or_path], batch_size=1, max_new_tokens=max_new_tokens, stats=stats)[0]
+
+    def batch(self, images, batch_size=8, max_new_tokens=None, stats=None):
+        """Same contract as ``MangaOcr.batch``."""
+        images = [load_gray(img) for img in images]
+        results = [None] * len(images)
+        keys = [None] * len(images)
+        if self.cache is not None:
+            for i, img in enumerate(images):
+                keys[i] = self.cache.key(img)
+                results[i] = self.cache.get(keys[i])
+        todo = [i for i, result in enumerate(results) if result is None]
+
+        timings = dict.fromkeys(STAGES, 0.0)
+        row_steps = [None] * len(images)
+        decode_steps = 0
+        for start in range(0, len(todo), batch_size):
+            chunk = todo[start:start + batch_size]
+            limit = max_new_tokens or max(estimate_max_new_tokens(images[i].size) for i in chunk)
+            t = time.perf_counter()
+            pixel_values = self._preprocess([images[i] for i in chunk])
+            timings["preprocess"] += time.perf_counter() - t
+            token_ids = self._generate(pixel_values, limit, timings)
+            decode_steps += len(token_ids[0])
+            for i, steps in zip(chunk, row_decode_steps(token_ids, self.meta["eos_token_id"])):
+                row_steps[i] = steps
+            for i, ids in zip(chunk, token_ids):
+                t = time.perf_counter()
+                text = self._decode(ids)
+                timings["tokenizer_decode"] += time.perf_counter() - t
+                t = time.perf_counter()
+                results[i] = post_process(text)
+                timings["post_process"] += time.perf_counter() - t
+                if self.cache is not None:
+                    self.cache.put(keys[i], results[i])
+        if stats is not None:
+            stats["decode_steps"] = decode_steps
+            stats["row_steps"] = row_steps
+            stats["timings"] = timings
+        return results
+
+    def _preprocess(self, images):
+        pixel_values = np.empty((len(images), 3, self.size[1], self.size[0]), dtype=np.float32)
+        return normalize_into(images, pixel_values, self.size, self.mean, self.std)
+
+    def _generate(self, pixel_values, max_new_tokens=300, timings=None):
+        """Greedy decoding with the KV cache; returns one token id list per row.
+
+        Rows that hit EOS are padded; the loop ends when all rows have finished.
+        Encoder and decode-loop seconds are added to ``timings`` if given.
+        """
+        t = time.perf_counter()
+        hidden = self.encoder.run(None, {"pixel_values": pixel_values})[0]
+        encoded = time.perf_counter()
+        rows = len(pixel_values)
+        eos, pad = self.meta["eos_token_id"], self.meta["pad_token_id"]
+        input_ids = np.full((rows, 1), self.meta["decoder_start_token_id"], dtype=np.int64)
+        finished = np.zeros(rows, dtype=bool)
+        tokens = []
+
+        outputs = self.decoder.run(None, {"input_ids": input_ids, "encoder_hidden_states": hidden})
+        while True:
+            logits, past = outputs[0], outputs[1:]
+            next_ids = np.where(finished, pad, logits[:, -1].argmax(-1))
+            tokens.append(next_ids)
+            finished |= next_ids == eos
+            if finished.all() or len(tokens) == max_new_tokens:
+                break
+            feed = {"input_ids": next_ids[:, None].astype(np.int64), "encoder_hidden_states": hidden}
+            feed.update({f"past_{name}": value for name, value in zip(self.kv_names, past)})
+            outputs = self.decoder_with_past.run(None, feed)
+
+        if timings is not None:
+            timings["encoder"] += encoded - t
+            timings["decode_loop"] += time.perf_counter() - encoded
+
+        return np.stack(tokens, axis=1).tolist() if tokens else [[] for _ in range(rows)]
+
+    def _decode(self, ids):
+        tokens = []
+        for token_id in ids:
+            if token_id == self.meta["eos_token_id"]:
+                break
+            if token_id not in self.special_ids:
+                tokens.append(self.vocab[token_id])
+        return " ".join(tokens).replace(" ##", "").replace("##", "")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export manga-ocr to ONNX or run the ONNX engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("--model", default="kha-white/manga-ocr-base")
+    export_parser.add_argument("--out", default="onnx_model")
+    export_parser.add_argument("--opset", type=int, default=17)
+    export_parser.add_argument("--download", action="store_true", help="allow downloading the checkpoint")
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("model_dir")
+    run_parser.add_argument("images", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.model, args.out, local_files_only=not args.download, opset=args.opset)
+    else:
+        mocr = OnnxMangaOcr(args.model_dir)
+        for path, text in zip(args.images, mocr.batch(args.images)):
+            print(f"{path}: {text}")
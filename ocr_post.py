@@ -0,0 +1,37 @@
+import re
+import math
+
+import jaconv
+
+
+def post_process(text):
+    text = "".join(text.split())
+    text = text.replace("…", "...")
+    text = re.sub("[・.]{2,}", lambda x: (x.end() - x.start()) * ".", text)
+    text = jaconv.h2z(text, ascii=True, digit=True)
+
+    return text
+
+
+def estimate_max_new_tokens(size, min_tokens=16, max_tokens=300, min_glyph_px=10, max_lines=6, line_pitch=1.25):
+    """Upper bound on how many characters fit in a crop of ``size`` (width, height).
+
+    Glyphs are taken as squares at least ``min_glyph_px`` and at least
+    ``1 / max_lines`` of the short side across; lines (or columns) run along the
+    long side, ``line_pitch`` glyphs apart. On ``test_data/images`` this gives
+    38-114 tokens for crops holding 3-26 characters.
+    """
+    short, long = sorted(size)
+    glyph = max(min_glyph_px, short / max_lines)
+    lines = max(1, int(short // (glyph * line_pitch)))
+    cells = math.ceil(long / glyph) * lines
+    return int(min(max_tokens, max(min_tokens, cells + 2)))
+
+
+def row_decode_steps(rows, eos_token_id):
+    """Decode steps each row took: generated tokens up to and including its first EOS."""
+    steps = []
+    for row in rows:
+        row = list(row)
+        steps.append(row.index(eos_token_id) + 1 if eos_token_id in row else len(row))
+    return steps
@@ -0,0 +1,102 @@
+import io
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+def load_gray(img_or_path):
+    """Open a path, PIL image or NumPy array as an 8-bit grayscale PIL image.
+
+    A contiguous 2-D uint8 array is wrapped without copying its pixels.
+    """
+    if isinstance(img_or_path, str) or isinstance(img_or_path, Path):
+        img = Image.open(img_or_path)
+    elif isinstance(img_or_path, Image.Image):
+        img = img_or_path
+    elif isinstance(img_or_path, np.ndarray):
+        img = Image.fromarray(np.ascontiguousarray(img_or_path, dtype=np.uint8))
+    else:
+        raise ValueError(f"img_or_path must be a path, PIL.Image or numpy array, instead got: {img_or_path}")
+    return img if img.mode == "L" else img.convert("L")
+
+
+def gray_from_buffer(buf, width, height, stride=None):
+    """View a raw 8-bit grayscale buffer (bytes, memoryview, QImage bits...) as a 2-D array.
+
+    ``stride`` is the number of bytes per row when rows are padded.
+    """
+    stride = stride or width
+    arr = np.frombuffer(buf, dtype=np.uint8, count=stride * height).reshape(height, stride)
+    return arr[:, :width]
+
+
+def gray_from_bgra(buf, width, height, stride=None, box=None):
+    """Grayscale copy of a region of a 32-bit BGRA/BGRX buffer (QImage Format_RGB32 / ARGB32).
+
+    Only the ``box`` (left, top, right, bottom) region is read from ``buf``,
+    converted with the same weights and rounding as PIL's ``convert("L")``.
+    """
+    stride = stride or width * 4
+    arr = np.frombuffer(buf, dtype=np.uint8, count=stride * height).reshape(height, stride)
+    arr = arr[:, :width * 4].reshape(height, width, 4)
+    if box is not None:
+        left, top, right, bottom = box
+        arr = arr[top:bottom, left:right]
+    b, g, r = (arr[..., i].astype(np.uint32) for i in range(3))
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+def normalize_into(images, out, size, mean, std, resample=Image.BILINEAR):
+    """Resize grayscale ``images`` and write normalized pixels into ``out``.
+
+    ``out`` is a preallocated float32 array of shape (N, C, H, W). Each image is
+    resized with one native PIL call; grayscale replicated to RGB means every
+    channel only differs by its mean/std, so normalization is one fused
+    multiply-add per channel.
+    """
+    scale = 1.0 / (255.0 * np.asarray(std, dtype=np.float32))
+    offset = np.asarray(mean, dtype=np.float32) / np.asarray(std, dtype=np.float32)
+    for i, img in enumerate(images):
+        pixels = np.asarray(img.resize(size, resample))
+        for c in range(out.shape[1]):
+            np.multiply(pixels, scale[c], out=out[i, c], casting="unsafe")
+            out[i, c] -= offset[c]
+    return out
+
+
+RAW_GRAY_CONTENT_TYPE = "application/x-gray8"
+
+
+def decode_image(fp):
+    """Decode an encoded image file object into a grayscale PIL image.
+
+    The pixels are decoded here rather than on first use, and anything PIL
+    cannot decode (corrupt or non-image data, decompression bombs) is raised
+    as ValueError.
+    """
+    try:
+        img = Image.open(fp)
+        img.load()
+        return load_gray(img)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ValueError(f"cannot decode image: {e}") from e
+
+
+def decode_upload(body, content_type=None, shape=None):
+    """Turn an uploaded request body into a grayscale PIL image.
+
+    ``application/x-gray8`` bodies are raw 8-bit pixels whose size is given by
+    ``shape`` ("<height>x<width>", the X-Image-Shape header); they are wrapped
+    without any image decoding. Anything else is decoded with PIL. Raises
+    ValueError for a malformed or undecodable body.
+    """
+    if content_type and content_type.split(";")[0].strip() == RAW_GRAY_CONTENT_TYPE:
+        try:
+            height, width = (int(v) for v in shape.lower().split("x"))
+        except (AttributeError, ValueError):
+            raise ValueError(f"raw gray uploads need an X-Image-Shape of <height>x<width>, got: {shape}")
+        if len(body) != height * width:
+            raise ValueError(f"raw gray upload is {len(body)} bytes, expected {height}x{width}")
+        return load_gray(gray_from_buffer(body, width, height))
+    return decode_image(io.BytesIO(body))
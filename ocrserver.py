@@ -1,20 +1,328 @@
 import bottle
 import ocr
-import io
+import os
+import json
+import gc
+import sys
+import signal
+import socket
+import argparse
+import multiprocessing
 import yaml
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+from loguru import logger
+from batcher import MicroBatcher
+from ocr_cache import OcrCache
+from ocr_pre import decode_upload, decode_image
+import metrics
 with open("conf.yaml", "r", encoding="utf-8") as f:
     conf = yaml.safe_load(f)
 app = bottle.Bottle()
-mocr = ocr.MangaOcr(local_files_only=True,force_cpu=True,pretrained_model_name_or_path=conf["ocr"]["local_model"])
+
+# Upload formats /ocr accepts, cheapest first: raw 8-bit gray pixels with an
+# X-Image-Shape header (no decode at all), lossless PNG, or lossy WEBP.
+TRANSPORTS = ("raw", "png", "webp")
+
+# Set up by load_model() in the parent and start_worker() in every serving process.
+mocr = None
+cache = None
+batcher = None
+
+
+# Metrics are per process: in prefork mode each scrape is answered by one worker.
+registry = metrics.Registry()
+REQUESTS = registry.counter("ocr_requests_total", "OCR HTTP requests by route")
+STAGE_SECONDS = registry.histogram(
+    "ocr_stage_seconds", "Time spent per stage: body_read and image_decode per request, the rest per batch",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+BATCH_SIZE = registry.histogram("ocr_batch_size", "Images per batched inference call",
+                                buckets=(1, 2, 4, 8, 16, 32, 64))
+DECODE_STEPS = registry.histogram("ocr_decode_steps", "Decode loop iterations per batch",
+                                  buckets=(4, 8, 16, 32, 64, 128, 300))
+registry.gauge("ocr_queue_depth", "Images waiting in the batcher queue",
+               fn=lambda: batcher.qsize() if batcher is not None else None)
+registry.counter("ocr_cache_lookups_total", "OCR cache lookups by result",
+                 fn=lambda: {(("result", "hit"),): cache.hits, (("result", "miss"),): cache.misses} if cache is not None else {})
+registry.gauge("ocr_cache_hit_ratio", "Fraction of OCR cache lookups that hit",
+               fn=lambda: cache.hits / max(1, cache.hits + cache.misses) if cache is not None else None)
+registry.gauge("ocr_cache_bytes", "Bytes held by the in-memory OCR cache",
+               fn=lambda: cache.size_bytes if cache is not None else None)
+registry.gauge("ocr_model_ready", "1 once the model is loaded and warmed up",
+               fn=lambda: int(mocr is not None and mocr.is_ready()))
+registry.gauge("ocr_model_bytes", "Bytes of model parameters and buffers",
+               fn=lambda: mocr.mocr.model_bytes() if mocr is not None and mocr.is_ready() and hasattr(mocr.mocr, "model_bytes") else None)
+registry.gauge("process_resident_memory_bytes", "Resident set size of this process", fn=metrics.process_rss_bytes)
+
+
+def record_batch(size, stats):
+    """MicroBatcher.on_batch hook: batch size, decode steps and per-stage model timings."""
+    BATCH_SIZE.observe(size)
+    if stats.get("decode_steps"):
+        DECODE_STEPS.observe(stats["decode_steps"])
+        for stage, seconds in stats["timings"].items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """One thread per connection, so concurrent requests can meet in the batcher."""
+    daemon_threads = True
+
+    def get_request(self):
+        # The shared listening socket is non-blocking (see serve_prefork); the
+        # connections themselves should block as usual.
+        conn, addr = self.socket.accept()
+        conn.setblocking(True)
+        return conn, addr
+
+
+@app.route("/metrics")
+def metrics_route():
+    bottle.response.content_type = metrics.CONTENT_TYPE
+    return registry.render()
+
+
+@app.route("/ready")
+def ready_route():
+    if not mocr.is_ready():
+        bottle.response.status = 503
+    return {"state": mocr.state}
+
+
+def ocr_images(images):
+    """OCR grayscale images through the cache and the batcher, in order.
+
+    Returns None if the model failed to load or is not ready within
+    ocr.ready_timeout.
+    """
+    keys = [cache.key(img) for img in images]
+    results = [cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses and not (mocr.wait_ready(conf["ocr"].get("ready_timeout", 60)) and mocr.is_ready()):
+        return None
+    # Queued together, so the batcher packs them into as few generate calls as possible.
+    futures = [(i, batcher.submit(images[i])) for i in misses]
+    for i, future in futures:
+        results[i] = future.result()
+        cache.put(keys[i], results[i])
+    return results
+
+
+def not_ready():
+    bottle.response.status = 503
+    bottle.response.set_header("Retry-After", "5")
+    return {"error": f"OCR model is {mocr.state}"}
+
+
+@app.route("/ocr/capabilities")
+def capabilities_route():
+    return {"transports": list(TRANSPORTS)}
+
+
 @app.route("/ocr", method="POST")
 def ocr_route():
-    image = io.BytesIO(bottle.request.body.read())
-    if not image:
+    REQUESTS.inc(route="/ocr")
+    with STAGE_SECONDS.time(stage="body_read"):
+        body = bottle.request.body.read()
+    if not body:
+        return {"error": "No image uploaded"}
+
+    try:
+        with STAGE_SECONDS.time(stage="image_decode"):
+            img = decode_upload(body, bottle.request.content_type, bottle.request.get_header("X-Image-Shape"))
+    except ValueError as e:
+        bottle.response.status = 400
+        return {"error": str(e)}
+    results = ocr_images([img])
+    if results is None:
+        return not_ready()
+    return {"result": results[0]}
+
+
+def parse_boxes(raw, width, height):
+    """Parse the ``boxes`` JSON of /ocr/batch into crop boxes clamped to a width x height page.
+
+    Raises ValueError for anything but a list of [left, top, right, bottom]
+    numbers, and for boxes that are empty once clamped to the page.
+    """
+    usage = "boxes must be a JSON list of [left, top, right, bottom]"
+    try:
+        boxes = json.loads(raw)
+    except ValueError:
+        raise ValueError(usage) from None
+    if not isinstance(boxes, list):
+        raise ValueError(usage)
+    clamped = []
+    for i, box in enumerate(boxes):
+        if (not isinstance(box, list) or len(box) != 4
+                or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in box)):
+            raise ValueError(f"{usage}; box {i} is {box!r}")
+        left, top, right, bottom = (int(v) for v in box)
+        left, right = max(0, left), min(width, right)
+        top, bottom = max(0, top), min(height, bottom)
+        if right <= left or bottom <= top:
+            raise ValueError(f"box {i} {box!r} is empty or outside the {width}x{height} page")
+        clamped.append((left, top, right, bottom))
+    return clamped
+
+
+@app.route("/ocr/batch", method="POST")
+def ocr_batch_route():
+    """Many regions in one request, as multipart form data.
+
+    Either a ``page`` image plus ``boxes``, a JSON list of [left, top, right,
+    bottom] pixel boxes (the page is decoded once and cropped here), or any
+    number of ``crops`` files. Results come back in the same order.
+    """
+    REQUESTS.inc(route="/ocr/batch")
+    with STAGE_SECONDS.time(stage="body_read"):
+        files = bottle.request.files
+    page = files.get("page")
+    if page is not None:
+        try:
+            with STAGE_SECONDS.time(stage="image_decode"):
+                img = decode_image(page.file)
+            boxes = parse_boxes(bottle.request.forms.get("boxes", "[]"), img.width, img.height)
+        except ValueError as e:
+            bottle.response.status = 400
+            return {"error": str(e)}
+        images = [img.crop(box) for box in boxes]
+    else:
+        try:
+            with STAGE_SECONDS.time(stage="image_decode"):
+                images = [decode_image(crop.file) for crop in files.getall("crops")]
+        except ValueError as e:
+            bottle.response.status = 400
+            return {"error": str(e)}
+    if not images:
         return {"error": "No image uploaded"}
-    
-    result = mocr(Image.open(image))
-    return {"result": result}
+
+    results = ocr_images(images)
+    if results is None:
+        return not_ready()
+    return {"results": results}
+
+
+def build_model():
+    """Load the model with ocr.backend; "auto" self-checks every backend and keeps the fastest accurate one.
+
+    The self-check runs real inference (and torch.compile) over the test
+    images, so it happens in a spawned throwaway process: the process that
+    loads the model here, and in prefork mode forks right after, never starts
+    thread pools or compile workers. Set ocr.backend explicitly to skip it.
+    """
+    backend = conf["ocr"].get("backend", "fp32")
+    if backend == "auto":
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            backend = pool.submit(ocr.auto_backend, conf["ocr"]["local_model"],
+                                  conf["ocr"].get("backend_min_match", 1.0)).result()
+        logger.info(f"Self-check picked backend {backend}; set ocr.backend: {backend} to skip the check")
+    model = ocr.MangaOcr(local_files_only=True,force_cpu=True,pretrained_model_name_or_path=conf["ocr"]["local_model"])
+    if backend != "fp32":
+        model = model.with_backend(backend)
+    return model
+
+
+def load_model(lazy=False):
+    """Load in the background (the port opens right away) or, with lazy=False, before returning."""
+    global mocr
+    if lazy:
+        mocr = ocr.LazyMangaOcr(build_model).start()
+    else:
+        # No warm-up inference here: prefork mode forks right after this.
+        mocr = ocr.LazyMangaOcr(build_model, warmup=False).load()
+        if mocr.error is not None:
+            # Fail startup instead of forking workers that can only answer 503.
+            raise mocr.error
+
+
+def start_worker(threads=None):
+    """Per-process state: torch thread share, cache connection and batcher thread."""
+    global cache, batcher
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    # The routes look the cache up before queueing and store the results themselves;
+    # the model gets no cache, or batch() would count every miss a second time.
+    cache = OcrCache(max_bytes=conf["ocr"].get("cache_mb", 16) * 1024 * 1024, db_path=conf["ocr"].get("cache_db"))
+    batcher = MicroBatcher(mocr, window_ms=conf["ocr"].get("batch_window_ms", 10), max_batch=conf["ocr"].get("max_batch", 8),
+                           on_batch=record_batch)
+
+
+def _serve_socket(sock):
+    httpd = ThreadingWSGIServer(sock.getsockname(), WSGIRequestHandler, bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = sock
+    httpd.server_address = sock.getsockname()
+    httpd.server_name = socket.getfqdn(httpd.server_address[0])
+    httpd.server_port = httpd.server_address[1]
+    httpd.setup_environ()
+    httpd.set_app(app)
+    httpd.serve_forever()
+
+
+def serve_prefork(host, port, workers):
+    """Fork ``workers`` processes that accept on one shared listening socket.
+
+    The model is already loaded when this runs, so the weights are shared
+    copy-on-write between the workers instead of being loaded once per process.
+    """
+    sock = socket.create_server((host, port), backlog=128)
+    sock.setblocking(False)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Keep the garbage collector from writing to (and so un-sharing) every
+    # object page the parent created while loading the model.
+    gc.freeze()
+
+    children = []
+    for index in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                start_worker(threads)
+                logger.info(f"Worker {index} (pid {os.getpid()}) serving with {threads} torch threads")
+                _serve_socket(sock)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    sock.close()
+    logger.info(f"Listening on http://{host}:{port}/ with {workers} workers")
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop(signal.SIGINT, None)
+        for pid in children:
+            os.waitpid(pid, 0)
+
 
 if __name__ == "__main__":
-    bottle.run(app, host="0.0.0.0", port=8379)
+    parser = argparse.ArgumentParser(description="manga-ocr HTTP server")
+    parser.add_argument("--host", default=conf["ocr"].get("host", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=conf["ocr"].get("port", 8379))
+    parser.add_argument("--workers", type=int, default=conf["ocr"].get("workers", 1),
+                        help="number of forked worker processes sharing the loaded model")
+    args = parser.parse_args()
+
+    if args.workers > 1 and hasattr(os, "fork"):
+        load_model()
+        serve_prefork(args.host, args.port, args.workers)
+    else:
+        if args.workers > 1:
+            logger.warning(f"Multi-worker mode needs os.fork, not available on {sys.platform}; using one worker")
+        load_model(lazy=True)
+        start_worker()
+        bottle.run(app, host=args.host, port=args.port, server_class=ThreadingWSGIServer)
@@ -0,0 +1,172 @@
+"""asyncio/ASGI serving mode with the same /ocr contract as ocrserver.py.
+
+    python ocrserver_asgi.py            # needs uvicorn
+
+At most ``ocr.max_queue`` requests are admitted at once; the rest get 503
+with Retry-After right away instead of queueing. Every request has a deadline
+(``X-Request-Timeout`` seconds from the client, capped at
+``ocr.request_timeout``); requests whose deadline passes, or whose client
+disconnects, are dropped before they reach the model.
+"""
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+from batcher import DeadlineExceeded
+from ocr_pre import decode_upload
+import metrics
+import ocrserver
+
+conf = ocrserver.conf
+
+
+class OcrAsgiApp:
+    def __init__(self, mocr, cache, batcher, max_queue=32, request_timeout=10.0, retry_after=1):
+        self.mocr = mocr
+        self.cache = cache
+        self.batcher = batcher
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        # Image decoding stays off the event loop; inference has its own batcher thread.
+        self.decode_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ocr-decode")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    self.decode_executor.shutdown(wait=False)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        if scope["path"] == "/ocr" and scope["method"] == "POST":
+            ocrserver.REQUESTS.inc(route="/ocr")
+            await self.ocr(scope, receive, send)
+        elif scope["path"] == "/ocr/capabilities":
+            await self.respond(send, 200, {"transports": list(ocrserver.TRANSPORTS)})
+        elif scope["path"] == "/metrics":
+            body = ocrserver.registry.render().encode("utf-8")
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", metrics.CONTENT_TYPE.encode())]})
+            await send({"type": "http.response.body", "body": body})
+        elif scope["path"] == "/ready":
+            await self.respond(send, 200 if self.mocr.is_ready() else 503, {"state": self.mocr.state})
+        else:
+            await self.respond(send, 404, {"error": "Not found"})
+
+    async def ocr(self, scope, receive, send):
+        if self.in_flight >= self.max_queue:
+            await self.respond(send, 503, {"error": "Server busy"}, retry_after=self.retry_after)
+            return
+        self.in_flight += 1
+        try:
+            deadline = time.monotonic() + self.timeout_for(scope)
+            body = await self.read_body(receive)
+            if not body:
+                await self.respond(send, 200, {"error": "No image uploaded"})
+                return
+
+            headers = dict(scope["headers"])
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            shape = headers.get(b"x-image-shape", b"").decode("latin-1")
+            loop = asyncio.get_running_loop()
+            try:
+                img = await loop.run_in_executor(self.decode_executor, decode_upload, body, content_type, shape)
+            except ValueError as e:
+                await self.respond(send, 400, {"error": str(e)})
+                return
+            key = self.cache.key(img)
+            result = self.cache.get(key)
+            if result is None:
+                if not self.mocr.is_ready():
+                    await self.respond(send, 503, {"error": f"OCR model is {self.mocr.state}"}, retry_after=5)
+                    return
+                result = await self.infer(img, deadline, receive)
+                if result is None:
+                    await self.respond(send, 504, {"error": "Deadline exceeded"})
+                    return
+                self.cache.put(key, result)
+            await self.respond(send, 200, {"result": result})
+        finally:
+            self.in_flight -= 1
+
+    async def infer(self, img, deadline, receive):
+        """Run ``img`` through the batcher; None if the deadline passes or the client leaves."""
+        future = self.batcher.submit(img, deadline=deadline)
+        inference = asyncio.wrap_future(future)
+        disconnect = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            done, _ = await asyncio.wait({inference, disconnect}, timeout=max(0.0, deadline - time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if inference in done:
+                return inference.result()
+            return None
+        except DeadlineExceeded:
+            return None
+        finally:
+            disconnect.cancel()
+            # Cancelling the wrapper cancels the queued Future, so the batcher skips it.
+            inference.cancel()
+
+    def timeout_for(self, scope):
+        for name, value in scope["headers"]:
+            if name == b"x-request-timeout":
+                try:
+                    return min(float(value), self.request_timeout)
+                except ValueError:
+                    break
+        return self.request_timeout
+
+    @staticmethod
+    async def read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return b""
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def respond(send, status, payload, retry_after=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_app():
+    # Same model, cache, batcher and metrics setup as ocrserver's single-worker mode.
+    ocrserver.load_model(lazy=True)
+    ocrserver.start_worker()
+    return OcrAsgiApp(ocrserver.mocr, ocrserver.cache, ocrserver.batcher,
+                      max_queue=conf["ocr"].get("max_queue", 32),
+                      request_timeout=conf["ocr"].get("request_timeout", 10.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="manga-ocr asyncio server")
+    parser.add_argument("--host", default=conf["ocr"].get("host", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=conf["ocr"].get("port", 8379))
+    args = parser.parse_args()
+
+    import uvicorn
+    logger.info(f"Serving ASGI OCR on http://{args.host}:{args.port}/")
+    uvicorn.run(create_app(), host=args.host, port=args.port)
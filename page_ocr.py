@@ -0,0 +1,188 @@
+"""Whole-page OCR: find text regions, put them in manga reading order, OCR in batches.
+
+    python page_ocr.py test_data/images            # one JSON line per region
+    python page_ocr.py page.jpg --onnx onnx_model
+
+Detection is a CPU-only connected-components pass: dark strokes are
+dilated until the glyphs of a bubble merge, and components are kept if
+their size and ink density look like text rather than artwork.
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter
+from ocr_pre import load_gray
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+
+def _otsu_threshold(gray):
+    """Otsu threshold of an 8-bit image, or None when it has a single grey level (blank page)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    if np.count_nonzero(hist) < 2:
+        return None
+    weights = np.cumsum(hist)
+    means = np.cumsum(hist * np.arange(256))
+    total, total_mean = weights[-1], means[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (total_mean * weights - means * total) ** 2 / (weights * (total - weights))
+    if np.all(np.isnan(between)):
+        return None
+    return int(np.nanargmax(between))
+
+
+def _label(mask):
+    """8-connected components of a boolean mask as a list of (top, left, bottom, right) boxes.
+
+    Uses scipy when it is installed, otherwise run-length union-find.
+    """
+    try:
+        from scipy import ndimage
+    except ImportError:
+        ndimage = None
+    if ndimage is not None:
+        labels, _ = ndimage.label(mask, structure=np.ones((3, 3)))
+        return [(s[0].start, s[1].start, s[0].stop, s[1].stop) for s in ndimage.find_objects(labels)]
+
+    parent = []
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    runs = []  # (row, start, stop, run id)
+    prev = []
+    for y, row in enumerate(mask):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.view(np.int8), [0]))))
+        cur = []
+        for start, stop in zip(edges[::2], edges[1::2]):
+            run_id = len(parent)
+            parent.append(run_id)
+            for _, p_start, p_stop, p_id in prev:
+                if p_start <= stop and start <= p_stop:  # overlap incl. diagonal neighbours
+                    a, b = find(run_id), find(p_id)
+                    if a != b:
+                        parent[b] = a
+            cur.append((y, start, stop, run_id))
+        runs.extend(cur)
+        prev = cur
+
+    boxes = {}
+    for y, start, stop, run_id in runs:
+        root = find(run_id)
+        top, left, bottom, right = boxes.get(root, (y, start, y + 1, stop))
+        boxes[root] = (min(top, y), min(left, start), max(bottom, y + 1), max(right, stop))
+    return list(boxes.values())
+
+
+def detect_text_regions(page, max_side=1024, merge_px=5, min_px=8, max_area=0.25,
+                        min_ink=0.03, max_ink=0.45, pad=4):
+    """Candidate text boxes on ``page`` as (left, top, right, bottom) in page pixels.
+
+    The page is analysed at most ``max_side`` pixels on its long side; dark
+    pixels are dilated by ``merge_px`` so glyphs of one block join, and a
+    component is kept when it is at least ``min_px`` on both sides, covers at
+    most ``max_area`` of the page, and its ink density is within
+    [``min_ink``, ``max_ink``].
+    """
+    gray = load_gray(page)
+    scale = min(1.0, max_side / max(gray.size))
+    small = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.BILINEAR) \
+        if scale < 1.0 else gray
+    pixels = np.asarray(small)
+    threshold = _otsu_threshold(pixels)
+    if threshold is None:
+        return []
+    ink = pixels <= threshold
+
+    size = merge_px | 1  # MaxFilter wants an odd size
+    merged = Image.fromarray(ink.astype(np.uint8) * 255).filter(ImageFilter.MaxFilter(size))
+    mask = np.asarray(merged) > 0
+
+    page_area = mask.shape[0] * mask.shape[1]
+    boxes = []
+    for top, left, bottom, right in _label(mask):
+        h, w = bottom - top, right - left
+        if h < min_px or w < min_px or h * w > max_area * page_area:
+            continue
+        density = ink[top:bottom, left:right].mean()
+        if not min_ink <= density <= max_ink:
+            continue
+        boxes.append((
+            max(0, int((left - pad) / scale)),
+            max(0, int((top - pad) / scale)),
+            min(gray.width, int((right + pad) / scale)),
+            min(gray.height, int((bottom + pad) / scale)),
+        ))
+    return reading_order(boxes)
+
+
+def reading_order(boxes, row_overlap=0.5):
+    """Sort boxes in manga reading order: rows top to bottom, right to left within a row.
+
+    A box joins the current row when its top lies within ``row_overlap`` of the
+    row's first box height.
+    """
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        if rows:
+            first = rows[-1][0]
+            if box[1] < first[1] + row_overlap * (first[3] - first[1]):
+                rows[-1].append(box)
+                continue
+        rows.append([box])
+    return [box for row in rows for box in sorted(row, key=lambda b: -b[2])]
+
+
+def ocr_page(mocr, page, batch_size=8, boxes=None):
+    """OCR every text region of ``page``, yielding results as each batch finishes.
+
+    Yields dicts with ``index`` (reading order), ``box`` and ``text``.
+    """
+    gray = load_gray(page)
+    if boxes is None:
+        boxes = detect_text_regions(gray)
+    for start in range(0, len(boxes), batch_size):
+        chunk = boxes[start:start + batch_size]
+        texts = mocr.batch([gray.crop(box) for box in chunk], batch_size=batch_size)
+        for offset, (box, text) in enumerate(zip(chunk, texts)):
+            yield {"index": start + offset, "box": list(box), "text": text}
+
+
+def iter_images(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTS)
+        else:
+            yield path
+
+
+def ocr_pages(mocr, paths, batch_size=8):
+    """``ocr_page`` over image files and folders; each result also carries its ``page``."""
+    for path in iter_images(paths):
+        for result in ocr_page(mocr, path, batch_size=batch_size):
+            yield {"page": str(path), **result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="page images or folders of them")
+    parser.add_argument("--model", default="kha-white/manga-ocr-base")
+    parser.add_argument("--onnx", help="use an exported ONNX model directory instead of --model")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.onnx:
+        from ocr_onnx import OnnxMangaOcr
+        mocr = OnnxMangaOcr(args.onnx)
+    else:
+        import ocr
+        mocr = ocr.MangaOcr(pretrained_model_name_or_path=args.model)
+    for result in ocr_pages(mocr, args.paths, batch_size=args.batch_size):
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from loguru import logger
+
+
+class Lane:
+    """One kind of work: lower ``priority`` runs first, at most ``max_running`` at once.
+
+    Only the newest ``max_pending`` tasks are kept waiting; submitting to a
+    full lane cancels its oldest waiting task.
+    """
+
+    def __init__(self, name, priority, max_pending=1, max_running=1):
+        self.name = name
+        self.priority = priority
+        self.max_pending = max_pending
+        self.max_running = max_running
+        self.pending = deque()
+        self.running = 0
+
+
+class TaskScheduler:
+    """A small worker pool shared by several bounded, prioritized lanes.
+
+    Whenever a worker is free it takes the oldest task of the highest-priority
+    lane that is below its ``max_running`` limit, so a lane full of slow tasks
+    cannot hold back the others. A task submitted with ``is_current`` is
+    dropped (its Future cancelled) if ``is_current()`` is false by the time a
+    worker picks it up.
+    """
+
+    def __init__(self, lanes, workers=None):
+        self._lanes = sorted(lanes, key=lambda lane: lane.priority)
+        self._by_name = {lane.name: lane for lane in self._lanes}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"task-{i}", daemon=True)
+            for i in range(workers or sum(lane.max_running for lane in self._lanes))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, lane_name, fn, *args, is_current=None):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is shut down")
+            lane = self._by_name[lane_name]
+            while len(lane.pending) >= lane.max_pending:
+                lane.pending.popleft()[0].cancel()
+            lane.pending.append((future, fn, args, is_current))
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        for lane in self._lanes:
+            if lane.pending and lane.running < lane.max_running:
+                lane.running += 1
+                return lane, lane.pending.popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = self._next()
+                while task is None and not self._closed:
+                    self._cond.wait()
+                    task = self._next()
+                if task is None:
+                    return
+            lane, (future, fn, args, is_current) = task
+            try:
+                if is_current is not None and not is_current():
+                    future.cancel()
+                elif future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        logger.exception(f"{lane.name} 任务失败")
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    lane.running -= 1
+                    self._cond.notify_all()
+
+    def pending(self, lane_name):
+        with self._cond:
+            return len(self._by_name[lane_name].pending)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            for lane in self._lanes:
+                while lane.pending:
+                    lane.pending.popleft()[0].cancel()
+            self._cond.notify_all()
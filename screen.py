@@ -9,10 +9,8 @@ import datetime
 import io
 import yaml
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
 import voicevox
 import re
-import httpx
 
 log_history = deque(maxlen=500)
 logger.add(log_history.append, format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}\n")
@@ -27,12 +25,15 @@ from PySide6.QtCore import (Qt, QTimer, Signal, QObject, QPoint, QRect,
 from PySide6.QtGui import (QPainter, QPixmap, QColor, QPen, QFont, QAction, 
                            QIcon, QImage, QCursor, QGuiApplication, QClipboard,
                            QFontMetrics)
-from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer
+from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer, QAudioSink, QAudioFormat, QAudio
 
 from PIL import ImageGrab, Image
+from ocr_pre import gray_from_bgra
 from pynput import keyboard
 #import ocr
 import gTTSfun
+from translate_dispatch import TranslateDispatcher, TranslationError
+from scheduler import TaskScheduler, Lane
 
 # Global config storage
 GLOBAL_CONFIG = {}
@@ -75,15 +76,53 @@ if sys.platform.startswith('win'):
         pass
 
 fontname = "微软雅黑"
+TRANSLATE_PROVIDER_NAMES = {"ali": "阿里云百炼", "google": "google", "local": "本地模型"}
 
 class Signaller(QObject):
     """Signal bridge for non-GUI threads."""
-    ocr_done_signal = Signal(str)
+    ocr_done_signal = Signal(int, str)
+    ocr_error_signal = Signal(int, str)
     start_snip_signal = Signal()
     replay_sound_signal = Signal()
     translation_done_signal = Signal(int, str)
     translation_error_signal = Signal(int, str)
     tts_ready_signal = Signal(bytes)
+    tts_chunk_signal = Signal(int, bytes)
+    tts_stream_done_signal = Signal(int)
+
+
+class PcmStream(QIODevice):
+    """边合成边播放用的 PCM 缓冲：QAudioSink 从这里拉数据，合成好的段落不断追加到末尾。"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.buffer = bytearray()
+        self.pos = 0
+        self.finished = False
+        self.open(QIODevice.ReadOnly)
+
+    def append(self, pcm):
+        self.buffer += pcm
+        self.readyRead.emit()
+
+    def finish(self):
+        self.finished = True
+
+    def isSequential(self):
+        return True
+
+    def bytesAvailable(self):
+        return len(self.buffer) - self.pos + super().bytesAvailable()
+
+    def atEnd(self):
+        return self.finished and self.pos >= len(self.buffer)
+
+    def readData(self, maxlen):
+        data = bytes(self.buffer[self.pos:self.pos + maxlen])
+        self.pos += len(data)
+        return data
+
+    def writeData(self, data):
+        return -1
 
 
 class BottomMessageOverlay(QWidget):
@@ -305,8 +344,11 @@ class SnippingOverlay(QWidget):
         self.setMouseTracking(True)
         # self.setAttribute(Qt.WA_TranslucentBackground) # Not needed as we draw full screenshot
         
-        self.original_image = None # PIL Image
+        self.capture_image = None # QImage（32 位），与 original_pixmap 共享像素
+        self.original_image = None # PIL Image，仅在 Qt 截屏失败时使用
         self.original_pixmap = None # QPixmap
+        self.capture_screen = None # 被截取的屏幕（鼠标所在的那一块）
+        self.capture_dpr = 1.0 # 该屏幕自己的 DPR
         
         self.start_pos = QPoint()
         self.end_pos = QPoint()
@@ -314,12 +356,14 @@ class SnippingOverlay(QWidget):
         self.rect_selection = QRect()
         
         self.ocr_result = ""
+        self.ocr_result_rect = None # 当前 ocr_result 对应的选择框
+        self.pending_ocr = None # (job_id, rect)：已提交、尚未返回的推测 OCR
         self.translate_result = ""
         
-        # Debounce timer for OCR
+        # 选择框停止变化后立即推测识别，松开鼠标时多半已有结果
         self.ocr_timer = QTimer(self)
         self.ocr_timer.setSingleShot(True)
-        self.ocr_timer.setInterval(500)
+        self.ocr_timer.setInterval(GLOBAL_CONFIG.get("ocr", {}).get("speculative_delay_ms", 250))
         self.ocr_timer.timeout.connect(self.perform_ocr)
 
     def start_capture(self):
@@ -327,30 +371,43 @@ class SnippingOverlay(QWidget):
             self.close_overlay()
             return
 
-        # Grab screenshot using PIL (consistent with original logic)
-        try:
-            self.original_image = ImageGrab.grab()
-        except OSError:
-            # Fallback if grab fails
-            self.close_overlay()
-            return
-            
-        # Get device pixel ratio for correct scaling
-        screen = QApplication.primaryScreen()
+        # 只截鼠标所在的屏幕，并使用该屏幕自己的 DPR（混合 DPI 多显示器）
+        screen = QGuiApplication.screenAt(QCursor.pos()) or QGuiApplication.primaryScreen()
+
+        # Qt 直接截到 QPixmap（物理像素），不经过 PIL 和 tobytes 的整屏拷贝
+        pixmap = screen.grabWindow(0)
+        if not pixmap.isNull():
+            image = pixmap.toImage() # 光栅平台上与 pixmap 共享像素
+            if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied):
+                image = image.convertToFormat(QImage.Format_RGB32)
+            self.capture_image = image
+            self.original_pixmap = pixmap
+        else:
+            # Grab screenshot using PIL (e.g. platforms where Qt cannot grab the screen);
+            # ImageGrab.grab() only covers the primary screen
+            screen = QGuiApplication.primaryScreen()
+            try:
+                self.original_image = ImageGrab.grab()
+            except OSError:
+                # Fallback if grab fails
+                self.close_overlay()
+                return
+            self.original_pixmap = self.pil2pixmap(self.original_image)
         dpr = screen.devicePixelRatio()
-
-        # Convert PIL to QPixmap
-        self.original_pixmap = self.pil2pixmap(self.original_image)
         self.original_pixmap.setDevicePixelRatio(dpr)
+        self.capture_screen = screen
+        self.capture_dpr = dpr
         
-        # Setup window geometry to cover the captured area (Logical pixels)
-        self.setGeometry(0, 0, int(self.original_image.width / dpr), int(self.original_image.height / dpr))
+        # Overlay covers just that screen (Logical pixels)
+        geometry = screen.geometry()
+        self.setScreen(screen)
+        self.setGeometry(geometry.x(), geometry.y(), int(self.original_pixmap.width() / dpr), int(self.original_pixmap.height() / dpr))
         
         # Reset state
         self.start_pos = QPoint()
         self.end_pos = QPoint()
         self.is_selecting = False
-        self.ocr_result = ""
+        self.reset_ocr()
         self.translate_result = ""
         self.rect_selection = QRect()
         
@@ -397,8 +454,9 @@ class SnippingOverlay(QWidget):
         painter.setFont(font)
         
         #如果选择框底部低于屏幕下1/5，且顶部也低于屏幕上1/5，则改为在选择框上方显示结果
-        screen = QGuiApplication.primaryScreen()
-        available = screen.availableGeometry()
+        screen = self.capture_screen or QGuiApplication.primaryScreen()
+        # 屏幕可用区域换算到本窗口坐标（窗口位于该屏幕左上角）
+        available = screen.availableGeometry().translated(-screen.geometry().topLeft())
         x_base = self.rect_selection.left()
         max_w = max(100, self.width() - x_base)
         drawabove = False
@@ -440,12 +498,12 @@ class SnippingOverlay(QWidget):
             self.rect_selection = QRect(self.start_pos, self.end_pos)
             
             # Clear previous results
-            self.ocr_result = ""
+            self.controller.cancel_ocr()
+            self.reset_ocr()
             self.translate_result = ""
-            if self.ocr_timer.isActive():
-                self.ocr_timer.stop()
             self.update()
         elif event.button() == Qt.RightButton:
+            self.controller.cancel_ocr()
             self.close_overlay()
 
     def mouseMoveEvent(self, event):
@@ -463,25 +521,43 @@ class SnippingOverlay(QWidget):
             self.end_pos = event.position().toPoint()
             self.rect_selection = QRect(self.start_pos, self.end_pos).normalized()
             
-            # If timer is running, stop it and run OCR immediately
-            if self.ocr_timer.isActive():
-                self.ocr_timer.stop()
-                self.perform_ocr()
-            elif not self.ocr_result:
-                # If no result yet, run it
-                self.perform_ocr()
-                
-            # As per original behavior: close on release, play sound
+            self.ocr_timer.stop()
+            rect = self.rect_selection
+            if self.ocr_result and self.can_reuse(self.ocr_result_rect, rect):
+                # 推测结果已经出来了，直接朗读
+                result = self.ocr_result
+                self.close_overlay()
+                self.controller.play_sound(result)
+                return
+            if self.pending_ocr is not None and self.can_reuse(self.pending_ocr[1], rect):
+                # 推测识别还在跑，结果出来后按最终结果处理
+                self.controller.finish_ocr(self.pending_ocr[0])
+            else:
+                self.perform_ocr(final=True)
+            # As per original behavior: close on release; the sound plays when OCR finishes
             self.close_overlay()
-            if self.ocr_result:
-                 self.controller.play_sound(self.ocr_result)
+
+    @staticmethod
+    def can_reuse(ocr_rect, rect):
+        """松开时的选择框与推测时相同，或落在其内且面积相差不大，则沿用推测结果。"""
+        if ocr_rect is None or not ocr_rect.contains(rect):
+            return False
+        min_ratio = GLOBAL_CONFIG.get("ocr", {}).get("speculative_min_area", 0.85)
+        return rect.width() * rect.height() >= min_ratio * ocr_rect.width() * ocr_rect.height()
+
+    def reset_ocr(self):
+        self.ocr_timer.stop()
+        self.ocr_result = ""
+        self.ocr_result_rect = None
+        self.pending_ocr = None
+
     @Slot()
-    def perform_ocr(self):
+    def perform_ocr(self, final=False):
         if self.rect_selection.width() < 10 or self.rect_selection.height() < 10:
             return
             
         # Scale to physical pixels for cropping
-        dpr = self.devicePixelRatio()
+        dpr = self.capture_dpr
         rect = self.rect_selection
         
         x = int(rect.x() * dpr)
@@ -490,34 +566,37 @@ class SnippingOverlay(QWidget):
         h = int(rect.height() * dpr)
         
         try:
-            crop = self.original_image.crop((x, y, x + w, y + h))
+            crop = self.crop_capture(x, y, w, h)
 
-            if self.controller.mocr is None:
-                self.controller.start_ocr(crop)
-            else:
-                result = self.controller.mocr(crop)
-                self.ocr_result = result
-                #logger.info(f"OCR Result: {result}")
-                
-                # Copy to clipboard
-                QApplication.clipboard().setText(result)
-                
-                self.update()
-                
-                cached_translation = gTTSfun.lookup_translation_cache(result)
-                if cached_translation is not None:
-                    self.set_translation(cached_translation)
+            mocr = self.controller.mocr
+            if mocr is not None and not mocr.is_ready():
+                # 模型还在后台加载（或加载失败），不阻塞界面
+                if mocr.state == "failed":
+                    self.controller.message_overlay.show_message(f"OCR 模型加载失败: {mocr.error}")
                 else:
-                    # Start translation
-                    self.controller.start_translate(result)
-                
-            
+                    self.controller.message_overlay.show_message("OCR 模型加载中，请稍候…", timeout_ms=2000)
+            else:
+                job_id = self.controller.start_ocr(crop, final=final)
+                self.pending_ocr = (job_id, QRect(rect))
         except Exception as e:
             self.ocr_result = f"OCR Error: {e}"
+            self.ocr_result_rect = None  # 只有 set_ocr_done 的结果能沿用
             self.update()
 
+    def crop_capture(self, x, y, w, h):
+        """选择区域（物理像素）的灰度图；只转换这一块，不复制整张截图。"""
+        if self.capture_image is None:
+            return self.original_image.crop((x, y, x + w, y + h))
+        image = self.capture_image
+        right = min(x + w, image.width())
+        bottom = min(y + h, image.height())
+        return gray_from_bgra(image.constBits(), image.width(), image.height(),
+                              stride=image.bytesPerLine(), box=(max(0, x), max(0, y), right, bottom))
+
     def set_ocr_done(self, result):
         self.ocr_result = result
+        self.ocr_result_rect = self.pending_ocr[1] if self.pending_ocr else None
+        self.pending_ocr = None
         QApplication.clipboard().setText(result)
             
         self.update()
@@ -529,6 +608,12 @@ class SnippingOverlay(QWidget):
             # Start translation
             self.controller.start_translate(result)
 
+    def set_ocr_error(self, message):
+        self.ocr_result = f"OCR Error: {message}"
+        self.ocr_result_rect = None  # 错误信息覆盖了之前的结果，松开时不能再沿用
+        self.pending_ocr = None
+        self.update()
+
     def set_translation(self, text):
         self.translate_result = text
         self.update()
@@ -537,8 +622,10 @@ class SnippingOverlay(QWidget):
         self.controller.cancel_translate()
         self.hide()
         # Clear large images to free memory
+        self.capture_image = None
         self.original_image = None
         self.original_pixmap = None
+        self.capture_screen = None
 
 class SnippingTool(QObject):
     def __init__(self):
@@ -546,8 +633,17 @@ class SnippingTool(QObject):
         
         # Initialize Logic
         self.mocr=None
+        self.ocr_client = None
         self.OcrConfigChange()
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        # OCR、语音、翻译各走一条有界队列，按优先级取任务；慢的翻译服务不会再挡住 OCR 和朗读
+        self.scheduler = TaskScheduler([
+            Lane("ocr", priority=0, max_pending=1),
+            Lane("tts", priority=1, max_pending=1),
+            Lane("translate", priority=2, max_pending=1),
+        ])
+        self.ocr_job_id = 0
+        self.tts_request_id = 0
+        self.ocr_final_job = None # 松开鼠标后需要复制并朗读结果的任务
         self.audio_output = QAudioOutput(self)
         self.audio_output.setVolume(1.0)
         self.audio_player = QMediaPlayer(self)
@@ -557,9 +653,24 @@ class SnippingTool(QObject):
         
         self.audio_buffer = None
         self.last_audio_data = b""
+        self.audio_sink = None # 流式播放（VOICEVOX 逐句合成）
+        self.audio_stream = None
+        self.audio_stream_id = 0
+        self.audio_stream_format = None
         self.pending_translation_text = ""
         self.translation_request_id = 0
 
+        # 阿里、Google、本地模型同时作为候选：最快的先发，超时或失败再并发请求下一个
+        self.translator = TranslateDispatcher(
+            {
+                "ali": gTTSfun.translate_with_ali,
+                "google": lambda text: gTTSfun.translate_with_api_key(
+                    text=text, target="zh-CN", api_key=GLOBAL_CONFIG.get("key", {}).get("gcloud", "")),
+                "local": gTTSfun.translate_with_local_model,
+            },
+            hedge_delay=GLOBAL_CONFIG.get("translate", {}).get("hedge_delay_ms", 800) / 1000,
+        )
+
         self.translation_timer = QTimer(self)
         self.translation_timer.setSingleShot(True)
         self.translation_timer.setInterval(1000)
@@ -568,11 +679,14 @@ class SnippingTool(QObject):
         # Signal bridge
         self.signaller = Signaller()
         self.signaller.ocr_done_signal.connect(self.on_ocr_done)
+        self.signaller.ocr_error_signal.connect(self.on_ocr_error)
         self.signaller.start_snip_signal.connect(self.start_snip)
         self.signaller.replay_sound_signal.connect(self.replay_sound)
         self.signaller.translation_done_signal.connect(self.on_translate_done)
         self.signaller.translation_error_signal.connect(self.on_translate_error)
         self.signaller.tts_ready_signal.connect(self.on_tts_ready)
+        self.signaller.tts_chunk_signal.connect(self.on_tts_chunk)
+        self.signaller.tts_stream_done_signal.connect(self.on_tts_stream_done)
         
         # UI Overlay
         self.overlay = SnippingOverlay(self)
@@ -614,11 +728,21 @@ class SnippingTool(QObject):
         self.message_overlay.show_message("启动完成", timeout_ms=5000)
     def OcrConfigChange(self):
         ocrserver_url = GLOBAL_CONFIG.get("ocr", {}).get("server_url", "")
+        if self.ocr_client is not None and self.ocr_client.url != ocrserver_url.rstrip("/"):
+            self.ocr_client.close()
+            self.ocr_client = None
+        if ocrserver_url and self.ocr_client is None:
+            from ocr_client import OcrClient
+            self.ocr_client = OcrClient(ocrserver_url, transport=GLOBAL_CONFIG.get("ocr", {}).get("transport", "auto"))
         if ocrserver_url and self.mocr is not None:
             self.mocr = None
         elif not ocrserver_url and self.mocr is None:
             import ocr
-            self.mocr = ocr.MangaOcr(force_cpu=False,local_files_only=True,pretrained_model_name_or_path=GLOBAL_CONFIG.get("ocr", {}).get("local_model", "kha-white/manga-ocr-base"))
+            from ocr_cache import OcrCache
+            ocr_config = GLOBAL_CONFIG.get("ocr", {})
+            self.mocr = ocr.LazyMangaOcr(lambda: ocr.MangaOcr(force_cpu=False,local_files_only=True,pretrained_model_name_or_path=ocr_config.get("local_model", "kha-white/manga-ocr-base")))
+            self.mocr.cache = OcrCache(db_path=ocr_config.get("cache_db"))
+            self.mocr.start()
     def open_settings(self):
         dlg = SettingsDialog()
         dlg.exec()
@@ -649,57 +773,56 @@ class SnippingTool(QObject):
         self.pending_translation_text = ""
         if not text:
             return
-        self.executor.submit(self.go_translate, request_id, text)
+        self.scheduler.submit("translate", self.go_translate, request_id, text,
+                              is_current=lambda: request_id == self.translation_request_id)
         
     def go_translate(self, request_id, text):
         if request_id != self.translation_request_id:
             return
 
-        error_messages = []
-
-        #阿里翻译
         try:
-            translated = gTTSfun.translate_with_ali(text)
+            result = self.translator.translate(text, cancelled=lambda: request_id != self.translation_request_id)
+        except TranslationError as e:
             if request_id == self.translation_request_id:
-                self.signaller.translation_done_signal.emit(request_id, translated)
+                error_messages = [f"{TRANSLATE_PROVIDER_NAMES[name]}翻译失败: {err}" for name, err in e.errors]
+                self.signaller.translation_error_signal.emit(request_id, "\n".join(error_messages))
             return
-        except Exception as e:
-            error_messages.append(f"阿里云百炼翻译失败: {str(e)}")
-
-        #google翻译
-        try:
-            api_key = GLOBAL_CONFIG.get("key", {}).get("gcloud", "")
-            translated = gTTSfun.translate_with_api_key(text=text, target="zh-CN", api_key=api_key)
-            if request_id == self.translation_request_id:
-                self.signaller.translation_done_signal.emit(request_id, translated)
+        if result is None:
             return
-        except Exception as e:
-            error_messages.append(f"google翻译失败: {str(e)}")
-
-        #本地模型
-        try:
-            translated = gTTSfun.translate_with_local_model(text=text)
-            if request_id == self.translation_request_id:
-                self.signaller.translation_done_signal.emit(request_id, translated)
-            return
-        except Exception as e:
-            error_messages.append(f"本地模型翻译失败: {str(e)}")
-
+        provider, translated = result
+        logger.debug(f"翻译来源：{TRANSLATE_PROVIDER_NAMES[provider]}，各服务延迟：{self.translator.snapshot()}")
         if request_id == self.translation_request_id:
-            self.signaller.translation_error_signal.emit(request_id, "\n".join(error_messages))
-
-    def start_ocr(self, image):
-        self.executor.submit(self.go_ocr, image)
-    def go_ocr(self, image):
+            self.signaller.translation_done_signal.emit(request_id, translated)
+
+    def start_ocr(self, image, final=False):
+        self.ocr_job_id += 1
+        self.ocr_final_job = self.ocr_job_id if final else None
+        job_id = self.ocr_job_id
+        self.scheduler.submit("ocr", self.go_ocr, job_id, image, is_current=lambda: job_id == self.ocr_job_id)
+        return job_id
+
+    def finish_ocr(self, job_id):
+        """Treat an in-flight speculative job as the final one."""
+        if job_id == self.ocr_job_id:
+            self.ocr_final_job = job_id
+
+    def cancel_ocr(self):
+        self.ocr_job_id += 1
+        self.ocr_final_job = None
+
+    def go_ocr(self, job_id, image):
+        if job_id != self.ocr_job_id:
+            return # 已被更新的选择框取代
         try:
-            data=io.BytesIO()
-            image.save(data, format='WEBP', quality=80)
-            res = httpx.post(GLOBAL_CONFIG.get("ocr", {}).get("server_url", ""), data=data.getvalue(), timeout=30)
-            resdt = res.json()
-            self.signaller.ocr_done_signal.emit(resdt.get("result", ""))
+            if self.mocr is not None:
+                text = self.mocr(image)
+            else:
+                text = self.ocr_client.ocr(image)
         except Exception as e:
             logger.error(f"OCR 失败: {e}")
-            self.signaller.ocr_done_signal.emit(f"OCR Error: {e}")
+            self.signaller.ocr_error_signal.emit(job_id, str(e))
+            return
+        self.signaller.ocr_done_signal.emit(job_id, text)
     @Slot(int, str)
     def on_translate_done(self, request_id, text):
         if request_id != self.translation_request_id:
@@ -714,16 +837,61 @@ class SnippingTool(QObject):
             return
         logger.error(f"翻译失败：{message}")
         self.message_overlay.show_message(message, timeout_ms=5000)
-    @Slot(str)
-    def on_ocr_done(self, text):
+    @Slot(int, str)
+    def on_ocr_done(self, job_id, text):
+        if job_id != self.ocr_job_id:
+            return
         logger.info(f"OCR 结果：{text}")
-        if self.overlay.isVisible():
+        if job_id == self.ocr_final_job:
+            self.ocr_final_job = None
+            QApplication.clipboard().setText(text)
+            if text:
+                self.play_sound(text)
+        elif self.overlay.isVisible():
             self.overlay.set_ocr_done(text)
+
+    @Slot(int, str)
+    def on_ocr_error(self, job_id, message):
+        if job_id != self.ocr_job_id:
+            return
+        if job_id == self.ocr_final_job:
+            self.ocr_final_job = None
+            self.message_overlay.show_message(f"OCR 失败: {message}", timeout_ms=5000)
+        elif self.overlay.isVisible():
+            self.overlay.set_ocr_error(message)
     def play_sound(self, text):
-        self.executor.submit(self.goPlaySound, text)
+        self.tts_request_id += 1
+        request_id = self.tts_request_id
+        self.scheduler.submit("tts", self.goPlaySound, text, request_id, is_current=lambda: request_id == self.tts_request_id)
         
-    def goPlaySound(self, sound_text):
+    def goPlaySound(self, sound_text, request_id=None):
         try:
+            voicevox_config = GLOBAL_CONFIG.get("voicevox", {})
+            if request_id is not None and voicevox_config.get("streaming", True):
+                # 逐句合成、边合成边播放：首句合成完就出声
+                sent = 0
+                try:
+                    for wav in voicevox.iter_japanese_tts(
+                        text=sound_text,
+                        speaker=voicevox_config.get("speaker_id", 68),
+                        speed_scale=voicevox_config.get("speed_scale", 0.9),
+                        output_sampling_rate=24000,
+                    ):
+                        if request_id != self.tts_request_id:
+                            return
+                        self.signaller.tts_chunk_signal.emit(request_id, wav)
+                        sent += 1
+                except RuntimeError as e:
+                    if sent:
+                        raise
+                    logger.warning(f"{e}，改用 Google TTS")
+                else:
+                    logger.info("VOICEVOX 已运行，使用 VOICEVOX TTS（流式）")
+                    self.signaller.tts_stream_done_signal.emit(request_id)
+                    return
+                fp = gTTSfun.japanese_tts(text=sound_text)
+                self.signaller.tts_ready_signal.emit(fp.getvalue())
+                return
             fp = voicevox.japanese_tts(
                 text=sound_text,
                 speaker=GLOBAL_CONFIG.get("voicevox", {}).get("speaker_id", 68),
@@ -739,6 +907,56 @@ class SnippingTool(QObject):
         except Exception as e:
             logger.error(f"语音播放失败: {e}")
 
+    def stop_audio_stream(self):
+        if self.audio_sink is not None:
+            self.audio_sink.stop()
+            self.audio_sink.deleteLater()
+            self.audio_sink = None
+        if self.audio_stream is not None:
+            self.audio_stream.close()
+            self.audio_stream.deleteLater()
+            self.audio_stream = None
+
+    @Slot(int, bytes)
+    def on_tts_chunk(self, request_id, wav):
+        if request_id != self.tts_request_id:
+            return
+        try:
+            pcm, rate, channels, sampwidth = voicevox.wav_to_pcm(wav)
+        except Exception as e:
+            logger.error(f"语音播放失败: {e}")
+            return
+        if self.audio_stream is None or self.audio_stream_id != request_id:
+            # 新的一句话：停掉上一段，开始新的流
+            self.audio_player.stop()
+            self.audio_player.setSource(QUrl()) # 重播时改用拼好的完整 WAV
+            self.stop_audio_stream()
+            fmt = QAudioFormat()
+            fmt.setSampleRate(rate)
+            fmt.setChannelCount(channels)
+            fmt.setSampleFormat(QAudioFormat.Int16 if sampwidth == 2 else QAudioFormat.UInt8)
+            self.audio_stream = PcmStream(self)
+            self.audio_stream_id = request_id
+            self.audio_stream_format = (rate, channels, sampwidth)
+            self.audio_sink = QAudioSink(fmt, self)
+            self.audio_sink.stateChanged.connect(self.on_audio_sink_state)
+            self.audio_stream.append(pcm)
+            self.audio_sink.start(self.audio_stream)
+        else:
+            self.audio_stream.append(pcm)
+
+    @Slot(int)
+    def on_tts_stream_done(self, request_id):
+        if request_id != self.audio_stream_id or self.audio_stream is None:
+            return
+        self.audio_stream.finish()
+        self.last_audio_data = voicevox.pcm_to_wav(bytes(self.audio_stream.buffer), *self.audio_stream_format)
+
+    @Slot(QAudio.State)
+    def on_audio_sink_state(self, state):
+        if state == QAudio.State.IdleState and self.audio_stream is not None and self.audio_stream.atEnd():
+            self.stop_audio_stream()
+
     @Slot(bytes)
     def on_tts_ready(self, audio_data):
         if not audio_data:
@@ -746,6 +964,7 @@ class SnippingTool(QObject):
             return
 
         self.last_audio_data = audio_data
+        self.stop_audio_stream()
         self.audio_player.stop()
 
         buffer = QBuffer(self)
@@ -773,6 +992,7 @@ class SnippingTool(QObject):
                 self.on_tts_ready(self.last_audio_data)
                 return
 
+            self.stop_audio_stream()
             self.audio_player.stop()
             self.audio_player.setPosition(0)
             self.audio_player.play()
@@ -814,7 +1034,12 @@ class SnippingTool(QObject):
         if self.listener:
             self.listener.stop()
         self.audio_player.stop()
-        self.executor.shutdown(wait=False)
+        self.stop_audio_stream()
+        self.cancel_ocr()
+        self.scheduler.shutdown()
+        self.translator.close()
+        if self.ocr_client is not None:
+            self.ocr_client.close()
         QApplication.quit()
 
 def enable_dpi_awareness():
@@ -845,6 +1070,15 @@ if __name__ == "__main__":
             logger.warning("VOICEVOX 可执行文件路径未配置或不存在，请在设置中检查")
         gTTSfun.set_ai_client(base_url=GLOBAL_CONFIG.get("translate", {}).get("local_model", None))
         gTTSfun.set_ali_ai_client(api_key=GLOBAL_CONFIG.get("key", {}).get("ali_key", None))
+        tts_config = GLOBAL_CONFIG.get("tts", {})
+        tts_cache_dir = tts_config.get("cache_dir", "data/tts_cache")
+        if tts_cache_dir:
+            from audio_cache import AudioCache
+            voicevox.audio_cache = gTTSfun.audio_cache = AudioCache(
+                tts_cache_dir, max_bytes=tts_config.get("cache_mb", 256) * 1024 * 1024)
+        translate_config = GLOBAL_CONFIG.get("translate", {})
+        gTTSfun.set_translation_memory(db_path=translate_config.get("memory_db", "data/translation_memory.db"),
+                                       max_mb=translate_config.get("memory_mb", 64))
         tool = SnippingTool()
         sys.exit(app.exec())
     except Exception as e:
@@ -1,28 +1,142 @@
+"""OCR benchmark on test_data.
+
+Reports model load time, cold and warm per-image latency (p50/p95/p99),
+images/sec for several batch sizes and thread counts, peak RSS and the
+character error rate against test_data/expected_results.json, as JSON:
+
+    python test.py --not-network --backend int8 --output bench.json
+"""
 import ocr
+import sys
 import json
+import time
+import argparse
 from pathlib import Path
-import sys
 import yaml
+from loguru import logger
 
-not_network = False
-if len(sys.argv) > 1 and sys.argv[1] == "--not-network":
-    not_network = True
+TEST_DATA_ROOT = Path(__file__).parent / "test_data"
 
-with open("conf.yaml", "r", encoding="utf-8") as f:
-    conf = yaml.safe_load(f)
 
-if not not_network:
-    import huggingface_hub
-    huggingface_hub.login(conf["key"]["hf_token"])
+def percentile(values, q):
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
 
-TEST_DATA_ROOT = Path(__file__).parent / "test_data"
 
-mocr = ocr.MangaOcr(local_files_only=not_network,force_cpu=False,pretrained_model_name_or_path=conf["ocr"]["local_model"])
+def latency_summary(seconds):
+    return {
+        "n": len(seconds),
+        "mean_ms": 1000 * sum(seconds) / len(seconds),
+        "p50_ms": 1000 * percentile(seconds, 50),
+        "p95_ms": 1000 * percentile(seconds, 95),
+        "p99_ms": 1000 * percentile(seconds, 99),
+    }
+
+
+def edit_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux and bytes on macOS.
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def load_engine(backend, conf, not_network):
+    if backend.startswith("onnx:"):
+        from ocr_onnx import OnnxMangaOcr
+        return OnnxMangaOcr(backend[len("onnx:"):])
+    return ocr.MangaOcr(local_files_only=not_network, force_cpu=False, backend=backend,
+                        pretrained_model_name_or_path=conf["ocr"]["local_model"])
+
+
+def run(args):
+    with open("conf.yaml", "r", encoding="utf-8") as f:
+        conf = yaml.safe_load(f)
+    if not args.not_network:
+        import huggingface_hub
+        huggingface_hub.login(conf["key"]["hf_token"])
+
+    expected_results = json.loads((TEST_DATA_ROOT / "expected_results.json").read_text(encoding="utf-8"))
+    images = [ocr.load_gray(TEST_DATA_ROOT / "images" / item["filename"]) for item in expected_results]
+    for img in images:
+        img.load()
+
+    start = time.perf_counter()
+    mocr = load_engine(args.backend, conf, args.not_network)
+    report = {"backend": args.backend, "images": len(images), "load_seconds": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    mocr(images[0])
+    report["cold_ms"] = 1000 * (time.perf_counter() - start)
+
+    seconds, results = [], []
+    for _ in range(args.repeat):
+        results = []
+        for img in images:
+            start = time.perf_counter()
+            results.append(mocr(img))
+            seconds.append(time.perf_counter() - start)
+    report["warm_latency"] = latency_summary(seconds)
+
+    errors = chars = 0
+    for item, result in zip(expected_results, results):
+        distance = edit_distance(item["result"], result)
+        errors += distance
+        chars += len(item["result"])
+        if distance:
+            logger.info(f"{item['filename']}: expected {item['result']} got {result}")
+    report["cer"] = errors / max(1, chars)
+
+    thread_counts = args.threads
+    if args.backend.startswith("onnx:"):
+        logger.warning("Thread sweep skipped for ONNX; sessions keep their own intra-op thread count")
+        thread_counts = [0]
+    throughput = []
+    for threads in thread_counts:
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        for batch_size in args.batch_sizes:
+            mocr.batch(images[:batch_size], batch_size=batch_size)  # warm-up at this shape
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                mocr.batch(images, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            throughput.append({"threads": threads, "batch_size": batch_size,
+                               "images_per_sec": args.repeat * len(images) / elapsed})
+            logger.info(f"threads={threads} batch={batch_size}: {throughput[-1]['images_per_sec']:.2f} img/s")
+    report["throughput"] = throughput
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
 
-expected_results = json.loads((TEST_DATA_ROOT / "expected_results.json").read_text(encoding="utf-8"))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--not-network", action="store_true", help="only use locally cached model files")
+    parser.add_argument("--backend", default="fp32", help=f"one of {ocr.BACKENDS} or onnx:<exported model dir>")
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 8])
+    parser.add_argument("--threads", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3, help="rounds over the test images per measurement")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
 
-for item in expected_results:
-    result = mocr(TEST_DATA_ROOT / "images" / item["filename"])
-    print(f"File: {item['filename']}")
-    print(f"Expected: {item['result']}")
-    print(f"Result: {result}")
\ No newline at end of file
+    report = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(report, encoding="utf-8")
+    else:
+        print(report)
@@ -0,0 +1,132 @@
+import time
+import threading
+from queue import Queue, Empty
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+class TranslationError(Exception):
+    """Every provider failed; ``errors`` is a list of (provider name, exception)."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{name}: {e}" for name, e in errors))
+        self.errors = errors
+
+
+class ProviderStats:
+    """EWMA of one provider's latency; failures count as ``failure_penalty`` seconds or more."""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.latency = None
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.latency = seconds if self.latency is None else self.alpha * seconds + (1 - self.alpha) * self.latency
+
+    def as_dict(self):
+        return {
+            "latency_ms": None if self.latency is None else round(self.latency * 1000),
+            "calls": self.calls,
+            "failures": self.failures,
+            "wins": self.wins,
+        }
+
+
+class TranslateDispatcher:
+    """Hedged fan-out over several translation providers.
+
+    ``providers`` maps a name to ``fn(text) -> str``. A request goes to the
+    fastest provider first (by latency EWMA; providers without samples keep
+    their configured order, after the measured ones). If it has not answered
+    after ``hedge_delay`` seconds, or as soon as it fails, the next provider is
+    started as well. The first success wins, queued attempts are cancelled and
+    late answers are dropped, though their latency still updates the stats.
+    """
+
+    def __init__(self, providers, hedge_delay=0.8, alpha=0.3, failure_penalty=5.0, max_workers=None):
+        self.providers = dict(providers)
+        self.hedge_delay = hedge_delay
+        self.failure_penalty = failure_penalty
+        self.stats = {name: ProviderStats(alpha) for name in self.providers}
+        self._lock = threading.Lock()
+        # Losing attempts keep running until their HTTP call returns, so leave room for them.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or 2 * len(self.providers),
+                                            thread_name_prefix="translate")
+
+    def order(self):
+        with self._lock:
+            names = list(self.providers)
+            measured = sorted((n for n in names if self.stats[n].latency is not None), key=lambda n: self.stats[n].latency)
+            return measured + [n for n in names if self.stats[n].latency is None]
+
+    def _call(self, name, text):
+        start = time.perf_counter()
+        try:
+            result = self.providers[name](text)
+        except Exception:
+            with self._lock:
+                self.stats[name].failures += 1
+                self.stats[name].record(max(time.perf_counter() - start, self.failure_penalty))
+            raise
+        with self._lock:
+            self.stats[name].record(time.perf_counter() - start)
+        return result
+
+    def translate(self, text, cancelled=None):
+        """Return ``(provider name, translation)``; None if ``cancelled()`` became true first.
+
+        Raises TranslationError when every provider failed.
+        """
+        waiting = deque(self.order())
+        done = Queue()
+        running = {}
+        errors = []
+
+        def launch():
+            name = waiting.popleft()
+            future = self._executor.submit(self._call, name, text)
+            running[future] = name
+            future.add_done_callback(done.put)
+
+        launch()
+        try:
+            while running:
+                try:
+                    future = done.get(timeout=self.hedge_delay if waiting else 0.25)
+                except Empty:
+                    if cancelled is not None and cancelled():
+                        return None
+                    if waiting:
+                        logger.debug(f"翻译超过 {self.hedge_delay}s 未返回，同时请求 {waiting[0]}")
+                        launch()
+                    continue
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append((name, e))
+                    if cancelled is not None and cancelled():
+                        return None
+                    if waiting:
+                        launch()
+                    continue
+                with self._lock:
+                    self.stats[name].wins += 1
+                return name, result
+        finally:
+            for future in running:
+                future.cancel()
+        raise TranslationError(errors)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
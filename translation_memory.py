@@ -0,0 +1,148 @@
+import re
+import time
+import sqlite3
+import difflib
+import threading
+import unicodedata
+
+from loguru import logger
+
+# OCR tends to drop, double or confuse these, so they do not count when matching.
+_IGNORED = re.compile(r"[\s　、。，．,.!?！？…‥・「」『』（）()\[\]【】〈〉《》〜~―－\-\"'“”‘’]+")
+
+
+def normalize(text):
+    """Matching key for ``text``: NFKC, lower case, whitespace and punctuation removed."""
+    return _IGNORED.sub("", unicodedata.normalize("NFKC", text)).lower()
+
+
+def _bigrams(norm):
+    return {norm[i:i + 2] for i in range(len(norm) - 1)} or {norm}
+
+
+class TranslationMemory:
+    """Translations kept in sqlite, keyed by normalized source text and provider.
+
+    Lookups first try the exact normalized text; otherwise candidates sharing
+    character bigrams with it are scored with difflib, and the best one is used
+    if its similarity is at least ``min_ratio`` (so OCR variants differing by a
+    character still hit). Texts shorter than ``min_fuzzy_len`` only match
+    exactly. When the stored source and translation text exceed
+    ``max_bytes``, the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path, max_bytes=64 * 1024 * 1024, min_ratio=0.9, min_fuzzy_len=4, candidates=20):
+        self.max_bytes = max_bytes
+        self.min_ratio = min_ratio
+        self.min_fuzzy_len = min_fuzzy_len
+        self.candidates = candidates
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tm (
+                id INTEGER PRIMARY KEY,
+                norm TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                UNIQUE (norm, provider)
+            );
+            CREATE TABLE IF NOT EXISTS tm_gram (gram TEXT NOT NULL, id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS tm_gram_gram ON tm_gram (gram);
+            CREATE INDEX IF NOT EXISTS tm_gram_id ON tm_gram (id);
+            CREATE INDEX IF NOT EXISTS tm_last_used ON tm (last_used);
+        """)
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM tm").fetchone()[0]
+        logger.info(f"翻译记忆库: {db_path}（{self._bytes // 1024} KB）")
+
+    def get(self, text, provider=None):
+        """Cached translation of ``text`` by ``provider`` (any provider if None), or None."""
+        norm = normalize(text)
+        if not norm:
+            return None
+        with self._lock:
+            where, args = ("norm = ?", [norm]) if provider is None else ("norm = ? AND provider = ?", [norm, provider])
+            row = self._db.execute(f"SELECT id, translation FROM tm WHERE {where} ORDER BY last_used DESC LIMIT 1", args).fetchone()
+            if row is None and len(norm) >= self.min_fuzzy_len:
+                row = self._fuzzy(norm, provider)
+                if row is not None:
+                    self.fuzzy_hits += 1
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE tm SET last_used = ? WHERE id = ?", (time.time(), row[0]))
+            self._db.commit()
+            return row[1]
+
+    def _fuzzy(self, norm, provider):
+        grams = list(_bigrams(norm))
+        marks = ",".join("?" * len(grams))
+        sql = f"""
+            SELECT tm.id, tm.norm, tm.translation FROM tm_gram JOIN tm ON tm.id = tm_gram.id
+            WHERE tm_gram.gram IN ({marks}) {"" if provider is None else "AND tm.provider = ?"}
+            GROUP BY tm.id ORDER BY COUNT(*) DESC LIMIT ?
+        """
+        args = grams + ([] if provider is None else [provider]) + [self.candidates]
+        best, best_ratio = None, self.min_ratio
+        for row_id, cand, translation in self._db.execute(sql, args):
+            matcher = difflib.SequenceMatcher(None, norm, cand, autojunk=False)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = (row_id, translation), ratio
+        return best
+
+    def put(self, text, provider, translation):
+        norm = normalize(text)
+        if not norm or not translation:
+            return
+        size = len(text.encode("utf-8")) + len(translation.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("SELECT id, size FROM tm WHERE norm = ? AND provider = ?", (norm, provider)).fetchone()
+            if old is not None:
+                self._db.execute("UPDATE tm SET source = ?, translation = ?, size = ?, last_used = ? WHERE id = ?",
+                                 (text, translation, size, time.time(), old[0]))
+                self._bytes += size - old[1]
+            else:
+                cur = self._db.execute(
+                    "INSERT INTO tm (norm, provider, source, translation, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (norm, provider, text, translation, size, time.time()))
+                self._db.executemany("INSERT INTO tm_gram (gram, id) VALUES (?, ?)",
+                                     [(gram, cur.lastrowid) for gram in _bigrams(norm)])
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until 90% of ``max_bytes`` is used."""
+        target = self.max_bytes * 0.9
+        evicted = []
+        for row_id, size in self._db.execute("SELECT id, size FROM tm ORDER BY last_used"):
+            if self._bytes <= target:
+                break
+            evicted.append((row_id,))
+            self._bytes -= size
+        self._db.executemany("DELETE FROM tm_gram WHERE id = ?", evicted)
+        self._db.executemany("DELETE FROM tm WHERE id = ?", evicted)
+        logger.debug(f"翻译记忆库淘汰 {len(evicted)} 条")
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
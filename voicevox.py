@@ -9,6 +9,9 @@ from loguru import logger
 import urllib.parse
 import signal
 import re
+import wave
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import validate_call
 
 # 配置
@@ -18,6 +21,7 @@ ENGINE_URL = "http://localhost:50021"  # 如果改了端口这里也要同步改
 CHECK_TIMEOUT = 5  # 秒
 
 voicevox_proc: subprocess.Popen | None = None
+audio_cache = None  # audio_cache.AudioCache，由调用方设置；命中时不访问引擎
 requests=httpx.Client(timeout=CHECK_TIMEOUT)
 def is_voicevox_running() -> bool:
     """检测 VOICEVOX 是否已经在运行"""
@@ -99,19 +103,12 @@ def stop_voicevox():
 
     voicevox_proc = None
 
-@validate_call
-def japanese_tts(
-    text: str = "こんにちは、これはテスト文です。",
-    speaker: int = 8,
-    speed_scale: float = 1.0,
-    output_sampling_rate: int = 24000,
-) -> BytesIO:
-    # 第一步：生成 audio_query（包含 sampling_rate）
+def _audio_query(text, speaker, speed_scale, output_sampling_rate):
     query_url = urllib.parse.urljoin(ENGINE_URL, "/audio_query")
     query_params = {"text": text, "speaker": speaker}
     response = requests.post(query_url, params=query_params)
     if response.status_code != 200:
-        logger.error("Audio query 失败:", response.text)
+        logger.error(f"Audio query 失败: {response.text}")
         return None
 
     query = response.json()
@@ -119,22 +116,197 @@ def japanese_tts(
     query["speedScale"] = float(speed_scale)
     # 显式提升输出采样率，降低播放器按 48k 假设解码时产生“倍速感”的风险。
     query["outputSamplingRate"] = int(output_sampling_rate)
+    return query
 
-
-    # 第二步：合成音频
+def _synthesis(query, speaker):
     synth_url = urllib.parse.urljoin(ENGINE_URL, "/synthesis")
     synth_params = {"speaker": speaker}
     audio_response = requests.post(synth_url, params=synth_params, json=query)
     if audio_response.status_code != 200:
-        logger.error("Synthesis 失败:", audio_response.text)
+        logger.error(f"Synthesis 失败: {audio_response.text}")
+        return None
+    return audio_response.content
+
+@validate_call
+def japanese_tts(
+    text: str = "こんにちは、これはテスト文です。",
+    speaker: int = 8,
+    speed_scale: float = 1.0,
+    output_sampling_rate: int = 24000,
+) -> BytesIO:
+    if audio_cache is not None:
+        cached = audio_cache.get(text, "voicevox", speaker, speed_scale, output_sampling_rate)
+        if cached is not None:
+            logger.info("使用缓存的 VOICEVOX 语音")
+            return BytesIO(cached)
+
+    # 第一步：生成 audio_query（包含 sampling_rate）
+    query = _audio_query(text, speaker, speed_scale, output_sampling_rate)
+    if query is None:
         return None
 
-    audio_bytes = audio_response.content
+    # 第二步：合成音频
+    audio_bytes = _synthesis(query, speaker)
+    if audio_bytes is None:
+        return None
+    if audio_cache is not None:
+        audio_cache.put(text, "voicevox", audio_bytes, speaker, speed_scale, output_sampling_rate)
 
     # 按 WAV 文件流加载，避免把带文件头的数据当成原始 PCM 缓冲区解释
     audio_stream = BytesIO(audio_bytes)
     audio_stream.seek(0)
     return audio_stream
+# 句末标点（含紧跟的右括号）处切分；过长的句子再在逗号处切分
+_SENTENCE_END = re.compile(r"(?<=[。！？!?…♪\n])(?![」』）)。！？!?…♪])|(?<=[。！？!?…♪][」』）)])(?![」』）)])")
+_PHRASE_END = re.compile(r"(?<=[、，,])")
+
+def split_sentences(text: str, max_chars: int = 40) -> list[str]:
+    """把文本切成适合逐段合成的句子/短语，保证每段不超过 max_chars（除非无处可切）"""
+    chunks = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        current = ""
+        for phrase in _PHRASE_END.split(sentence):
+            if current and len(current) + len(phrase) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += phrase
+        if current:
+            chunks.append(current)
+    # 只有标点的片段并入前一段，避免合成空语音
+    merged = []
+    for chunk in chunks:
+        if merged and not re.search(r"\w", chunk):
+            merged[-1] += chunk
+        else:
+            merged.append(chunk)
+    return merged
+
+def iter_japanese_tts(
+    text: str,
+    speaker: int = 8,
+    speed_scale: float = 1.0,
+    output_sampling_rate: int = 24000,
+    max_chars: int = 40,
+    prefetch: int = 1,
+):
+    """逐句合成：依次产出每一段的 WAV 字节。
+
+    第 N 段返回给调用方播放时，后面 prefetch 段的 audio_query/synthesis 已经在后台线程里进行，
+    所以首段出声只需要第一句的合成时间。某段合成失败时抛出 RuntimeError。
+    """
+    chunks = split_sentences(text, max_chars=max_chars)
+    with ThreadPoolExecutor(max_workers=prefetch + 1, thread_name_prefix="voicevox") as pool:
+        futures = [pool.submit(japanese_tts, chunk, speaker, speed_scale, output_sampling_rate)
+                   for chunk in chunks[:prefetch + 1]]
+        for i in range(len(chunks)):
+            if i + prefetch + 1 < len(chunks):
+                futures.append(pool.submit(japanese_tts, chunks[i + prefetch + 1], speaker, speed_scale, output_sampling_rate))
+            try:
+                audio_stream = futures[i].result()
+                if audio_stream is None:
+                    raise RuntimeError(f"VOICEVOX 合成失败: {chunks[i]}")
+                yield audio_stream.getvalue()
+            except BaseException:
+                for future in futures[i + 1:]:
+                    future.cancel()
+                raise
+
+def _multi_synthesis(queries, speaker):
+    """一次请求合成多条；返回与 queries 对应的 WAV 列表，引擎不支持或失败时返回 None"""
+    url = urllib.parse.urljoin(ENGINE_URL, "/multi_synthesis")
+    try:
+        response = requests.post(url, params={"speaker": speaker}, json=queries,
+                                 timeout=max(CHECK_TIMEOUT, 2.0 * len(queries)))
+    except httpx.HTTPError as e:
+        logger.warning(f"multi_synthesis 请求失败: {e}")
+        return None
+    if response.status_code != 200:
+        logger.warning(f"multi_synthesis 不可用 ({response.status_code})，改为逐条合成")
+        return None
+    try:
+        with zipfile.ZipFile(BytesIO(response.content)) as zf:
+            names = sorted(n for n in zf.namelist() if n.lower().endswith(".wav"))
+            wavs = [zf.read(name) for name in names]
+    except zipfile.BadZipFile as e:
+        logger.warning(f"multi_synthesis 返回的不是 zip: {e}")
+        return None
+    return wavs if len(wavs) == len(queries) else None
+
+@validate_call
+def japanese_tts_batch(
+    lines: list[str],
+    speaker: int = 8,
+    speed_scale: float = 1.0,
+    output_sampling_rate: int = 24000,
+    max_concurrency: int = 4,
+    use_multi_synthesis: bool = True,
+) -> list[bytes | None]:
+    """批量合成多行文本（例如整页台词预先配音），返回与 lines 一一对应的 WAV 字节，失败的行为 None。
+
+    已缓存的行直接取缓存；其余行并发请求 /audio_query（最多 max_concurrency 个同时进行），
+    再用一次 /multi_synthesis 合成全部；引擎不支持时改为并发请求 /synthesis。结果写入音频缓存。
+    """
+    results = [None] * len(lines)
+    missing = []
+    for i, line in enumerate(lines):
+        cached = audio_cache.get(line, "voicevox", speaker, speed_scale, output_sampling_rate) if audio_cache is not None else None
+        if cached is not None:
+            results[i] = cached
+        elif line.strip():
+            missing.append(i)
+    if not missing:
+        return results
+
+    def query(i):
+        try:
+            return _audio_query(lines[i], speaker, speed_scale, output_sampling_rate)
+        except httpx.HTTPError as e:
+            logger.error(f"Audio query 失败: {e}")
+            return None
+
+    def synthesis(item):
+        try:
+            return _synthesis(item[1], speaker)
+        except httpx.HTTPError as e:
+            logger.error(f"Synthesis 失败: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="voicevox") as pool:
+        queries = list(pool.map(query, missing))
+        ready = [(i, query) for i, query in zip(missing, queries) if query is not None]
+        if not ready:
+            return results
+
+        wavs = _multi_synthesis([query for _, query in ready], speaker) if use_multi_synthesis and len(ready) > 1 else None
+        if wavs is None:
+            wavs = list(pool.map(synthesis, ready))
+
+    for (i, _), wav in zip(ready, wavs):
+        results[i] = wav
+        if wav is not None and audio_cache is not None:
+            audio_cache.put(lines[i], "voicevox", wav, speaker, speed_scale, output_sampling_rate)
+    return results
+
+def wav_to_pcm(data: bytes):
+    """解析 WAV，返回 (PCM 字节, 采样率, 声道数, 采样字节数)"""
+    with wave.open(BytesIO(data), "rb") as w:
+        return w.readframes(w.getnframes()), w.getframerate(), w.getnchannels(), w.getsampwidth()
+
+def pcm_to_wav(pcm: bytes, rate: int, channels: int = 1, sampwidth: int = 2) -> bytes:
+    out = BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return out.getvalue()
+
 # 主程序示例
 if __name__ == "__main__":
     try: